@@ -0,0 +1,90 @@
+"""
+import-time benchmark for wealth_builder_tools.  every sample runs in a
+fresh interpreter:
+
+    python benchmarks/import_time.py --runs 10 --budget 0.25
+
+reports the median wall time of `import wealth_builder_tools` and of a
+balance-only run against benchmarks/mock_plaid_server.py, and which heavy
+dependencies each one loaded.  exits non-zero if the import takes longer
+than --budget seconds or if the balance-only run imports pandas
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(os.path.dirname(HERE), 'source')
+sys.path.insert(0, SOURCE)
+
+HEAVY_MODULES = ['plaid', 'plaid.api.plaid_api', 'pandas', 'numpy', 'dateutil', 'pyarrow']
+
+IMPORT_ONLY = """
+import time
+start = time.perf_counter()
+import wealth_builder_tools
+seconds = time.perf_counter() - start
+"""
+
+BALANCE_ONLY = """
+import time
+start = time.perf_counter()
+import wealth_builder_tools
+wealth_builder_tools.plaid_interface().get_balance()
+seconds = time.perf_counter() - start
+"""
+
+REPORT = """
+import json, sys
+print(json.dumps({'seconds': seconds, 'loaded': [name for name in %r if name in sys.modules]}))
+""" % HEAVY_MODULES
+
+
+def sample(code, env):
+    output = subprocess.run([sys.executable, '-c', code + REPORT], cwd=SOURCE, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(name, code, env, runs):
+    samples = [sample(code, env) for _ in range(runs)]
+    seconds = statistics.median(result['seconds'] for result in samples)
+    loaded = samples[-1]['loaded']
+    print('%-14s median %7.4fs  loaded: %s' % (name, seconds, ', '.join(loaded) or 'nothing heavy'))
+    return seconds, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='import-time benchmark for wealth_builder_tools')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=0.25, help='max seconds for the bare import')
+    args = parser.parse_args()
+
+    from mock_plaid_server import MockPlaidServer
+    from run_benchmarks import configure_environment
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir, MockPlaidServer(0) as server:
+        saved = dict(os.environ)
+        configure_environment(server.url, workdir)
+        env = dict(os.environ, PYTHONPATH=SOURCE)
+        os.environ.clear()
+        os.environ.update(saved)
+
+        seconds, _ = measure('import', IMPORT_ONLY, env, args.runs)
+        if seconds > args.budget:
+            failures.append('import took %.3fs, budget %.3fs' % (seconds, args.budget))
+        _, loaded = measure('balance only', BALANCE_ONLY, env, args.runs)
+        if 'pandas' in loaded:
+            failures.append('balance-only run imported pandas')
+
+    if failures:
+        sys.exit('; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
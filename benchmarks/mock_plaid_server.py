@@ -0,0 +1,202 @@
+"""
+local stand-in for the plaid api, for benchmarks and offline runs.
+
+serves /accounts/get, /accounts/balance/get, /transactions/get and
+/transactions/sync from a synthetic data set, with configurable latency,
+error rate and volume.  point plaid_interface at it with PLAID_HOST:
+
+    python benchmarks/mock_plaid_server.py --transactions 100000 --port 8080
+    PLAID_HOST=http://127.0.0.1:8080 python source/wealth_builder_tools.py
+"""
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic_data import generate_transactions, to_plaid_json
+
+
+ACCOUNTS = [
+    ('Plaid Checking', 'Plaid Gold Standard 0% Interest Checking', 'depository', 'checking', '0000', 110.0, 100.0, None),
+    ('Plaid Saving', 'Plaid Silver Standard 0.1% Interest Saving', 'depository', 'savings', '1111', 210.0, 200.0, None),
+    ('Plaid Credit Card', 'Plaid Diamond 12.5% APR Interest Credit Card', 'credit', 'credit card', '3333', 410.0, None, 2000.0),
+    ('Plaid Mortgage', None, 'loan', 'mortgage', '8888', 56302.06, None, None),
+]
+
+
+def synthetic_accounts():
+    accounts = []
+    for i, (name, official_name, type, subtype, mask, current, available, limit) in enumerate(ACCOUNTS):
+        accounts.append({
+            'account_id': 'acct-%d-%s' % (i, mask),
+            'balances': {
+                'available': available, 'current': current, 'limit': limit,
+                'iso_currency_code': 'USD', 'unofficial_currency_code': None
+            },
+            'mask': mask,
+            'name': name,
+            'official_name': official_name,
+            'type': type,
+            'subtype': subtype,
+        })
+    return accounts
+
+
+ITEM = {
+    'item_id': 'item-mock', 'institution_id': 'ins_109508', 'webhook': None, 'error': None,
+    'available_products': [], 'billed_products': ['transactions'], 'consent_expiration_time': None,
+    'update_type': 'background'
+}
+
+
+class MockPlaidServer():
+    """
+    threaded http server answering the plaid endpoints plaid_interface
+    uses.  every request sleeps latency seconds first and fails with a plaid
+    INTERNAL_SERVER_ERROR with probability error_rate.  use as a context
+    manager or call start()/stop()
+    """
+
+    def __init__(self, transactions=1000, days=365, latency=0.0, error_rate=0.0, seed=0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.accounts = synthetic_accounts()
+        account_ids = [account['account_id'] for account in self.accounts]
+        self.load(to_plaid_json(generate_transactions(transactions, days, accounts=account_ids, seed=seed)))
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.thread = None
+
+    def load(self, transactions):
+        """
+        replaces the served transactions; they must be sorted newest first
+        """
+        self.transactions = transactions
+        # ascending keys for bisect, transactions are newest first
+        self.dates = [transaction['date'] for transaction in reversed(transactions)]
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, path, body):
+        """
+        returns (status, response dict) for one request
+        """
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return 500, self.error('API_ERROR', 'INTERNAL_SERVER_ERROR')
+        route = {
+            '/accounts/get': self.accounts_get,
+            '/accounts/balance/get': self.accounts_get,
+            '/transactions/get': self.transactions_get,
+            '/transactions/sync': self.transactions_sync,
+        }.get(path)
+        if route is None:
+            return 404, self.error('INVALID_REQUEST', 'NOT_FOUND')
+        return 200, dict(route(body), request_id=uuid.uuid4().hex[:15])
+
+    def accounts_get(self, body):
+        return {'accounts': self.accounts, 'item': ITEM}
+
+    def transactions_get(self, body):
+        options = body.get('options') or {}
+        offset = options.get('offset') or 0
+        count = options.get('count') or 100
+        # dates ascending -> index range, then flip into newest-first order
+        low = bisect.bisect_left(self.dates, body['start_date'])
+        high = bisect.bisect_right(self.dates, body['end_date'])
+        total = high - low
+        first = len(self.dates) - high + offset
+        last = min(len(self.dates) - low, first + count)
+        return {
+            'accounts': self.accounts,
+            'transactions': self.transactions[first:last],
+            'total_transactions': total,
+            'item': ITEM
+        }
+
+    def transactions_sync(self, body):
+        cursor = int(body.get('cursor') or 0)
+        count = body.get('count') or 100
+        added = self.transactions[cursor:cursor + count]
+        next_cursor = cursor + len(added)
+        return {
+            'transactions_update_status': 'HISTORICAL_UPDATE_COMPLETE',
+            'accounts': self.accounts,
+            'added': added,
+            'modified': [],
+            'removed': [],
+            'next_cursor': str(next_cursor),
+            'has_more': next_cursor < len(self.transactions)
+        }
+
+    def error(self, error_type, error_code):
+        return {
+            'error_type': error_type,
+            'error_code': error_code,
+            'error_message': 'mock plaid server error',
+            'display_message': None,
+            'request_id': uuid.uuid4().hex[:15]
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        status, response = self.server.mock.handle(self.path, body)
+        payload = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local stand-in for the plaid api')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--transactions', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockPlaidServer(args.transactions, args.days, args.latency, args.error_rate, args.seed, args.host, args.port)
+    print('mock plaid serving %d transactions on %s' % (len(server.transactions), server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,142 @@
+"""
+times plaid_interface against benchmarks/mock_plaid_server.py, so no plaid
+credentials are needed:
+
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --save baseline.json
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --compare baseline.json
+
+with --compare the run exits non-zero when any benchmark got slower than the
+baseline by more than --tolerance, so it can gate a deploy.
+
+get_account_history is dominated by plaid-python building its response
+models (a few ms per transaction), so the 1M case takes the better part of
+an hour and runs once
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'source'))
+
+from mock_plaid_server import MockPlaidServer  # noqa: E402
+from synthetic_data import generate_transactions, to_plaid_json  # noqa: E402
+
+
+def configure_environment(url, workdir):
+    """
+    points plaid_interface at the mock server.  must run before
+    wealth_builder_tools is imported, the rate limits are read at import
+    """
+    os.environ.update(
+        PLAID_HOST=url,
+        PLAID_ENV='sandbox',
+        PLAID_CLIENT_ID='benchmark',
+        PLAID_SECRET='benchmark',
+        PLAID_ACCESS_TOKEN='access-sandbox-benchmark',
+        PLAID_PRODUCTS='transactions',
+        PLAID_COUNTRY_CODES='US',
+        WEALTHBUILDER_DB=os.path.join(workdir, 'benchmark.db'),
+        WEALTHBUILDER_ARCHIVE=os.path.join(workdir, 'archive'),
+    )
+    # the real per-item quota would dominate every timing
+    os.environ.setdefault('PLAID_ITEM_RATE_PER_MINUTE', '1000000')
+    os.environ.setdefault('PLAID_ENDPOINT_RATE_PER_MINUTE', '1000000')
+
+
+def timed(function, repeat):
+    """
+    returns the wall clock seconds of repeat calls to function
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run(server, sizes, repeat, periods):
+    from transaction_decoder import decode_transactions
+    from transaction_schema import compact_frame
+    from wealth_builder_tools import plaid_interface
+
+    tool = plaid_interface()
+
+    def accounts():
+        tool.invalidate_cache()
+        tool.get_plaid_accounts()
+
+    results = {'get_plaid_accounts': timed(accounts, repeat)}
+    for size in sizes:
+        transactions = to_plaid_json(generate_transactions(size, days=28 * periods))
+        server.load(transactions)
+        # big sizes take minutes per call, one sample is plenty
+        runs = repeat if size <= 100000 else 1
+        results['get_account_history[%d]' % size] = timed(
+            lambda: tool.get_account_history(periods=periods, use_store=False), runs)
+        results['decode_transactions[%d]' % size] = timed(lambda: decode_transactions(transactions), runs)
+        frame = decode_transactions(transactions)
+        results['compact_frame[%d]' % size] = timed(lambda: compact_frame(frame), runs)
+    return results
+
+
+def summarize(results):
+    return {name: {'min': min(times), 'median': statistics.median(times), 'runs': len(times)}
+            for name, times in results.items()}
+
+
+def compare(summary, baseline, tolerance):
+    """
+    prints each benchmark against the baseline and returns the names that
+    regressed by more than tolerance (0.2 = 20% slower)
+    """
+    regressions = []
+    for name, stats in summary.items():
+        if name not in baseline:
+            continue
+        change = stats['min'] / baseline[name]['min'] - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-36s %+7.1f%%%s' % (name, change * 100, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='plaid_interface benchmarks against a local mock plaid')
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='comma separated transaction counts')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--periods', type=int, default=12, help='months of history requested')
+    parser.add_argument('--latency', type=float, default=0.0, help='mock server seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='mock server share of 500s')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='baseline json written by --save')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    with tempfile.TemporaryDirectory() as workdir, \
+            MockPlaidServer(0, latency=args.latency, error_rate=args.error_rate) as server:
+        configure_environment(server.url, workdir)
+        summary = summarize(run(server, sizes, args.repeat, args.periods))
+
+    for name, stats in summary.items():
+        print('%-36s min %9.4fs  median %9.4fs  (%d runs)' % (name, stats['min'], stats['median'], stats['runs']))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit('%d benchmark(s) regressed: %s' % (len(regressions), ', '.join(regressions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""
+fast synthetic plaid transactions for load tests.  every column is drawn
+with numpy in one shot and the string columns are written straight into
+arrow buffers, so the columnar form comes out at about 2M rows/s.  the
+json form is bound by building one python dict per row and runs at about
+0.3M rows/s:
+
+    frame = generate_transactions(1000000, days=730)    # decode_transactions layout
+    payload = to_plaid_json(frame)                      # /transactions/get shaped dicts
+
+the data has a zipf-distributed merchant catalog, monthly and bi-weekly
+recurring bills and paychecks, pending rows that later post (see
+post_pending) and a few percent of foreign and non-iso currency rows
+"""
+import datetime
+import gc
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'source'))
+
+from transaction_decoder import TRANSACTION_COLUMNS  # noqa: E402
+
+
+# (merchant_name, name on the statement, category path, payment_channel, typical amount)
+MERCHANTS = [
+    ('Starbucks', 'STARBUCKS STORE 1458', ['Food and Drink', 'Restaurants', 'Coffee Shop'], 'in store', 6.5),
+    ('Amazon', 'AMZN Mktp US*2K4LQ8', ['Shops', 'Digital Purchase'], 'online', 34.0),
+    ('Safeway', 'SAFEWAY #1711', ['Shops', 'Supermarkets and Groceries'], 'in store', 72.0),
+    ('Uber', 'UBER 063015 SF**POOL**', ['Travel', 'Taxi'], 'online', 18.0),
+    ('McDonald\'s', 'MCDONALD\'S F3285', ['Food and Drink', 'Restaurants', 'Fast Food'], 'in store', 11.0),
+    ('Shell', 'SHELL OIL 57444', ['Travel', 'Gas Stations'], 'in store', 48.0),
+    ('Target', 'TARGET T-2768', ['Shops', 'Department Stores'], 'in store', 56.0),
+    ('Whole Foods', 'WHOLEFDS SFO 10234', ['Shops', 'Supermarkets and Groceries'], 'in store', 64.0),
+    ('Chipotle', 'CHIPOTLE 0892', ['Food and Drink', 'Restaurants'], 'in store', 14.0),
+    ('Walgreens', 'WALGREENS #5321', ['Shops', 'Pharmacies'], 'in store', 22.0),
+    ('Lyft', 'LYFT *RIDE TUE 4PM', ['Travel', 'Taxi'], 'online', 21.0),
+    ('DoorDash', 'DD *DOORDASH BURGERK', ['Food and Drink', 'Restaurants'], 'online', 31.0),
+    ('Apple', 'APPLE.COM/BILL', ['Shops', 'Computers and Electronics'], 'online', 9.99),
+    ('United Airlines', 'UNITED AIRLINES', ['Travel', 'Airlines and Aviation Services'], 'online', 420.0),
+    ('Home Depot', 'THE HOME DEPOT #0618', ['Shops', 'Hardware Store'], 'in store', 88.0),
+    (None, 'ATM WITHDRAWAL 000123', ['Transfer', 'Withdrawal', 'ATM'], 'other', 100.0),
+    (None, 'VENMO PAYMENT', ['Transfer', 'Third Party', 'Venmo'], 'online', 40.0),
+]
+
+# long tail of the catalog, typical amount from a lognormal
+TAIL_CATEGORIES = [
+    ['Food and Drink', 'Restaurants'],
+    ['Shops'],
+    ['Service'],
+    ['Recreation', 'Arts and Entertainment'],
+    ['Healthcare', 'Healthcare Services'],
+]
+
+# (merchant_name, name, category path, amount, every) where every is 'monthly'
+# (on the day of the first date in range) or a number of days.  negative
+# amounts are money coming in, as plaid reports it
+RECURRING = [
+    ('Acme Payroll', 'ACME CORP PAYROLL PPD', ['Transfer', 'Payroll'], -2450.0, 14),
+    (None, 'RENT PAYMENT - AVALON', ['Payment', 'Rent'], 2150.0, 'monthly'),
+    ('Netflix', 'NETFLIX.COM', ['Service', 'Subscription'], 15.49, 'monthly'),
+    ('Spotify', 'SPOTIFY USA', ['Service', 'Subscription'], 10.99, 'monthly'),
+    ('Comcast', 'COMCAST CABLE COMM', ['Service', 'Cable'], 89.99, 'monthly'),
+    ('PG&E', 'PGANDE WEB ONLINE', ['Service', 'Utilities', 'Gas'], 112.0, 'monthly'),
+    ('24 Hour Fitness', '24 HOUR FITNESS USA', ['Recreation', 'Gyms and Fitness Centers'], 45.0, 'monthly'),
+    ('GEICO', 'GEICO *AUTO', ['Service', 'Insurance'], 132.4, 'monthly'),
+]
+
+# (iso_currency_code, unofficial_currency_code, share of rows, units per usd)
+CURRENCIES = [
+    ('USD', None, 0.93, 1.0),
+    ('EUR', None, 0.03, 0.92),
+    ('GBP', None, 0.02, 0.79),
+    ('CAD', None, 0.015, 1.36),
+    (None, 'CNH', 0.005, 7.1),
+]
+
+ACCOUNTS = ['acct-0-0000', 'acct-1-1111', 'acct-2-3333', 'acct-3-8888']
+
+
+def generate_transactions(count, days=365, accounts=None, seed=0, today=None, merchants=500, zipf=1.1,
+                          pending_days=3, pending_rate=0.5, refund_rate=0.02):
+    """
+    returns count synthetic transactions over the last days days, newest
+    first, as a DataFrame with the columns and dtypes of
+    decode_transactions.  rows dated within pending_days of today are pending
+    with probability pending_rate; posted rows within two weeks carry the
+    pending_transaction_id they replaced
+    """
+    rng = np.random.default_rng(seed)
+    accounts = accounts or ACCOUNTS
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    catalog = merchant_catalog(merchants, rng)
+    shops = len(catalog['name']) - len(RECURRING)
+
+    # recurring rows first, the rest is card spending
+    bill_codes, bill_dates = recurring_schedule(today, days)
+    bill_codes, bill_dates = bill_codes[:count] + shops, bill_dates[:count]
+    spend = count - len(bill_codes)
+
+    weights = 1.0 / np.arange(1, shops + 1) ** zipf
+    merchant = np.concatenate([bill_codes, rng.choice(shops, size=spend, p=weights / weights.sum())])
+    date = np.concatenate([bill_dates, today - rng.integers(0, days, size=spend)])
+    account = np.concatenate([np.zeros(len(bill_codes), dtype=np.int64), rng.integers(0, len(accounts), size=spend)])
+
+    amount = catalog['amount'][merchant] * rng.lognormal(0.0, 0.45, size=count)
+    amount[:len(bill_codes)] = catalog['amount'][bill_codes]
+    amount[len(bill_codes):] *= np.where(rng.random(spend) < refund_rate, -1, 1)
+
+    currency = rng.choice(len(CURRENCIES), size=count, p=[share for _, _, share, _ in CURRENCIES])
+    currency[:len(bill_codes)] = 0
+    amount *= np.array([rate for _, _, _, rate in CURRENCIES])[currency]
+
+    # newest first, ties latest row first.  ages fit in 16 bits, where a
+    # stable argsort is a radix sort
+    order = count - 1 - np.argsort((today - date).astype(np.int16)[::-1], kind='stable')
+    merchant, date, account, amount, currency = merchant[order], date[order], account[order], amount[order], currency[order]
+
+    age = today - date
+    pending = (age < np.timedelta64(pending_days, 'D')) & (rng.random(count) < pending_rate)
+    replaced = ~pending & (age < np.timedelta64(14, 'D')) & (rng.random(count) < pending_rate)
+    authorized = date - np.where(pending, 0, rng.integers(0, 3, size=count)).astype('timedelta64[D]')
+
+    width = len(str(max(count - 1, 0)))
+    ids = numbered_ids('txn-%d-' % seed, np.arange(count), width)
+    pending_ids = numbered_ids('ptxn-%d-' % seed, np.flatnonzero(replaced), width, valid=replaced)
+
+    columns = {
+        'transaction_id': ids.to_pandas(),
+        'account_id': pd.Categorical.from_codes(account, categories=accounts),
+        'date': date.astype('datetime64[s]'),
+        'authorized_date': authorized.astype('datetime64[s]'),
+        'amount_cents': np.rint(amount * 100).astype(np.int64),
+        'iso_currency_code': _categorical(currency, [iso for iso, _, _, _ in CURRENCIES]),
+        'unofficial_currency_code': _categorical(currency, [unofficial for _, unofficial, _, _ in CURRENCIES]),
+        'name': pa.array(catalog['name'], pa.large_string()).take(merchant).to_pandas(),
+        'merchant_name': _categorical(merchant, catalog['merchant_name']),
+        'category': _categorical(merchant, [path[0] for path in catalog['category']]),
+        'category_path': _categorical(merchant, [' > '.join(path) for path in catalog['category']]),
+        'pending': pending,
+        'pending_transaction_id': pending_ids.to_pandas(),
+        'payment_channel': _categorical(merchant, catalog['payment_channel']),
+        'transaction_type': _categorical(merchant, catalog['transaction_type']),
+    }
+    return columnar_frame(columns, count)
+
+
+def merchant_catalog(size, rng):
+    """
+    MERCHANTS followed by a generated long tail up to size entries, then the
+    RECURRING billers, as arrays indexed by merchant code
+    """
+    tail = max(0, size - len(MERCHANTS))
+    merchant_name = [merchant for merchant, _, _, _, _ in MERCHANTS]
+    name = [statement for _, statement, _, _, _ in MERCHANTS]
+    category = [path for _, _, path, _, _ in MERCHANTS]
+    channel = [channel for _, _, _, channel, _ in MERCHANTS]
+    amount = [typical for _, _, _, _, typical in MERCHANTS]
+
+    tail_categories = rng.integers(0, len(TAIL_CATEGORIES), size=tail)
+    merchant_name += ['Local Merchant %d' % i for i in range(tail)]
+    name += ['LOCAL MERCHANT %d #%04d' % (i, i * 7919 % 10000) for i in range(tail)]
+    category += [TAIL_CATEGORIES[code] for code in tail_categories]
+    channel += ['in store'] * tail
+    amount += np.round(rng.lognormal(3.2, 0.8, size=tail), 2).tolist()
+
+    merchant_name += [merchant for merchant, _, _, _, _ in RECURRING]
+    name += [statement for _, statement, _, _, _ in RECURRING]
+    category += [path for _, _, path, _, _ in RECURRING]
+    channel += ['other'] * len(RECURRING)
+    amount += [bill for _, _, _, bill, _ in RECURRING]
+    return {
+        'merchant_name': merchant_name,
+        'name': np.array(name, dtype=object),
+        'category': category,
+        'payment_channel': channel,
+        'transaction_type': ['place' if value == 'in store' else 'special' for value in channel],
+        'amount': np.array(amount),
+    }
+
+
+def recurring_schedule(today, days):
+    """
+    returns (RECURRING index, date) for every bill and paycheck due within
+    the last days days
+    """
+    first = today - (days - 1)
+    codes, dates = [], []
+    for code, (_, _, _, _, every) in enumerate(RECURRING):
+        if every == 'monthly':
+            months = np.arange(first.astype('datetime64[M]'), today.astype('datetime64[M]') + 1)
+            due = months.astype('datetime64[D]') + (first - first.astype('datetime64[M]').astype('datetime64[D]'))
+        else:
+            due = np.arange(first, today + 1, every)
+        due = due[(due >= first) & (due <= today)]
+        codes.append(np.full(len(due), code))
+        dates.append(due)
+    return np.concatenate(codes), np.concatenate(dates)
+
+
+def numbered_ids(prefix, numbers, width, valid=None):
+    """
+    arrow string array of prefix + each number zero padded to width digits,
+    written byte-wise into one buffer instead of formatting one python
+    string per row.  with a boolean valid mask the ids fill its true slots
+    in order and the other slots are null
+    """
+    # 32 bit division is markedly faster, and 9 digits fit
+    dtype = np.uint32 if width <= 9 else np.uint64
+    digits = np.asarray(numbers, dtype=dtype)[:, None] // (10 ** np.arange(width - 1, -1, -1)).astype(dtype) % 10
+    head = np.frombuffer(prefix.encode('ascii'), dtype=np.uint8)
+    raw = np.hstack([np.broadcast_to(head, (len(numbers), len(head))), digits.astype(np.uint8) + ord('0')])
+    data = pa.py_buffer(np.ascontiguousarray(raw))
+    if valid is None:
+        offsets = np.arange(len(numbers) + 1, dtype=np.int64) * raw.shape[1]
+        return pa.LargeStringArray.from_buffers(len(numbers), pa.py_buffer(offsets), data)
+    offsets = np.concatenate([[0], np.cumsum(valid)]).astype(np.int64) * raw.shape[1]
+    return pa.LargeStringArray.from_buffers(len(valid), pa.py_buffer(offsets), data,
+                                            pa.py_buffer(np.packbits(valid, bitorder='little')))
+
+
+def post_pending(frame, days=2, today=None):
+    """
+    the pending to posted transition for the pending rows of frame: returns
+    (removed transaction_ids, posted rows), the posted rows dated up to days
+    later under new ids that point back through pending_transaction_id,
+    which is how /transactions/sync reports a pending transaction clearing
+    """
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    pending = frame[frame['pending']]
+    posted = pending.copy()
+    posted['transaction_id'] = 'posted-' + pending['transaction_id'].astype(str)
+    posted['pending_transaction_id'] = pending['transaction_id']
+    posted['pending'] = False
+    posted['date'] = np.minimum(pending['date'].to_numpy() + np.timedelta64(days, 'D'), today)
+    return pending['transaction_id'].tolist(), posted
+
+
+def columnar_frame(columns, count):
+    """
+    lays columns out like decode_transactions, filling the ones that were
+    not generated with missing values of the right dtype
+    """
+    frame = {}
+    for column, _, kind in TRANSACTION_COLUMNS:
+        names = [column, column + '_path'] if kind == 'category_list' else [column]
+        for name in names:
+            if name in columns:
+                frame[name] = columns[name]
+            elif kind in ('category', 'category_list'):
+                frame[name] = pd.Categorical.from_codes(np.full(count, -1), categories=[])
+            elif kind == 'float':
+                frame[name] = np.full(count, np.nan)
+            else:
+                # a series of declared dtype is not scanned for what to infer
+                frame[name] = pd.Series(np.full(count, None, dtype=object), dtype=object, copy=False)
+    return pd.DataFrame(frame, copy=False)
+
+
+def to_plaid_json(frame):
+    """
+    turns a columnar frame back into /transactions/get shaped dicts, the
+    input plaid_interface and decode_transactions see from the api.  built
+    column by column: every field becomes one python list up front and the
+    rows are zipped out of them into dict displays, which python builds
+    about twice as fast as dict(zip(keys, row))
+    """
+    # millions of fresh dicts would otherwise trigger a cyclic collection
+    # every few hundred rows, which doubles the cost; the rows hold no
+    # cycles
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _plaid_rows(frame)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _plaid_rows(frame):
+    paths = [path.split(' > ') for path in frame['category_path'].cat.categories]
+    columns = zip(
+        _json_values(frame['transaction_id']),
+        _json_values(frame['account_id']),
+        (frame['amount_cents'].to_numpy() / 100).tolist(),
+        _json_values(frame['iso_currency_code']),
+        _json_values(frame['unofficial_currency_code']),
+        _json_values(frame['date']),
+        _json_values(frame['authorized_date']),
+        _json_values(frame['name']),
+        _json_values(frame['merchant_name']),
+        _lookup(frame['category_path'].cat.codes.to_numpy(), paths),
+        _json_values(frame['category_id']),
+        _json_values(frame['pending']),
+        _json_values(frame['pending_transaction_id']),
+        _json_values(frame['account_owner']),
+        _json_values(frame['payment_channel']),
+        _json_values(frame['transaction_type']),
+        _nested(frame, 'location.', LOCATION_FIELDS),
+        _nested(frame, 'payment_meta.', PAYMENT_META_FIELDS),
+    )
+    return [
+        {
+            'transaction_id': transaction_id,
+            'account_id': account_id,
+            'amount': amount,
+            'iso_currency_code': iso_currency_code,
+            'unofficial_currency_code': unofficial_currency_code,
+            'date': date,
+            'authorized_date': authorized_date,
+            'authorized_datetime': None,
+            'datetime': None,
+            'name': name,
+            'merchant_name': merchant_name,
+            'category': category,
+            'category_id': category_id,
+            'pending': pending,
+            'pending_transaction_id': pending_transaction_id,
+            'account_owner': account_owner,
+            'payment_channel': payment_channel,
+            'transaction_code': None,
+            'transaction_type': transaction_type,
+            'location': location,
+            'payment_meta': payment_meta,
+        }
+        for (transaction_id, account_id, amount, iso_currency_code, unofficial_currency_code, date, authorized_date,
+             name, merchant_name, category, category_id, pending, pending_transaction_id, account_owner,
+             payment_channel, transaction_type, location, payment_meta) in columns
+    ]
+
+
+def _nested(frame, prefix, fields):
+    """
+    one sub-dict per row from the prefix.field columns.  rows where every
+    field is missing, nearly all of them, share a single all-None dict
+    """
+    names = [prefix + field for field in fields]
+    empty = dict.fromkeys(fields)
+    blank = frame[names].isna().all(axis=1).to_numpy()
+    nested = [empty] * len(frame)
+    filled = np.flatnonzero(~blank)
+    if len(filled):
+        values = zip(*[_json_values(frame[name].iloc[filled]) for name in names])
+        for i, row in zip(filled.tolist(), values):
+            nested[i] = dict(zip(fields, row))
+    return nested
+
+
+def _lookup(codes, values):
+    """
+    values[code] per code as a list, None for -1
+    """
+    table = np.empty(len(values) + 1, dtype=object)
+    table[:len(values)] = values
+    return table[codes].tolist()
+
+
+LOCATION_FIELDS = [column.split('.', 1)[1] for column, _, _ in TRANSACTION_COLUMNS if column.startswith('location.')]
+PAYMENT_META_FIELDS = [column.split('.', 1)[1] for column, _, _ in TRANSACTION_COLUMNS
+                       if column.startswith('payment_meta.')]
+
+
+def _categorical(codes, categories):
+    """
+    Categorical over the distinct non-None categories, None entries and
+    duplicates folded onto one code
+    """
+    unique = list(dict.fromkeys(value for value in categories if value is not None))
+    lookup = np.array([-1 if value is None else unique.index(value) for value in categories])
+    return pd.Categorical.from_codes(lookup[codes], categories=unique)
+
+
+def _json_values(series):
+    if series.dtype.kind == 'M':
+        days = series.to_numpy().astype('datetime64[D]')
+        strings = np.datetime_as_string(days, unit='D').astype(object)
+        strings[np.isnat(days)] = None
+        return strings.tolist()
+    if series.dtype.kind in 'bi':
+        return series.tolist()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return _lookup(series.cat.codes.to_numpy(), series.cat.categories.astype(object).tolist())
+    # missing strings come back as nan from str columns
+    return series.astype(object).where(series.notna(), None).tolist()
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+import plaid
+
+from circuit_breaker import CircuitOpenError, is_endpoint_failure
+from instrumentation import response_rows
+from rate_limiting import RetryPolicy, is_rate_limited
+from transaction_store import token_key
+from wealth_builder_tools import (CIRCUIT_BREAKERS, INSTRUMENTATION, PLAID_MAX_PAGE_SIZE, RATE_LIMITER, plaid_host,
+                                 plaid_interface)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPlaidInterface():
+    """
+    awaitable counterpart of plaid_interface.  requests go straight to the
+    plaid json api over one httpx.AsyncClient, whose keep-alive pool is
+    shared by every coroutine on the event loop.  errors are raised as
+    plaid.ApiException so format_error and callers treat both the same
+    """
+
+    def __init__(self, access_token=None, max_connections=None, max_keepalive_connections=None,
+                 keepalive_expiry=None, timeout=None):
+        self.PLAID_CLIENT_ID = os.getenv('PLAID_CLIENT_ID')
+        self.PLAID_SECRET = os.getenv('PLAID_SECRET')
+        self.PLAID_ENV = os.getenv('PLAID_ENV')
+        self.ACCESS_TOKEN = access_token or os.getenv('PLAID_ACCESS_TOKEN')
+        self.PLAID_PAGE_SIZE = int(os.getenv('PLAID_PAGE_SIZE', PLAID_MAX_PAGE_SIZE))
+        self.PLAID_MAX_IN_FLIGHT = int(os.getenv('PLAID_MAX_IN_FLIGHT', 4))
+        self.PLAID_MAX_RETRIES = int(os.getenv('PLAID_MAX_RETRIES', 5))
+        self.host = plaid_host(self.PLAID_ENV)
+
+        limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv('PLAID_MAX_CONNECTIONS', 100)),
+            max_keepalive_connections=max_keepalive_connections or int(os.getenv('PLAID_MAX_KEEPALIVE', 20)),
+            keepalive_expiry=keepalive_expiry or float(os.getenv('PLAID_KEEPALIVE_EXPIRY', 30))
+        )
+        self.http = httpx.AsyncClient(
+            base_url=self.host,
+            limits=limits,
+            timeout=timeout or float(os.getenv('PLAID_TIMEOUT', 30)),
+            headers={'Plaid-Version': '2020-09-14'}
+        )
+        self.rate_limiter = RATE_LIMITER
+        self.circuit_breakers = CIRCUIT_BREAKERS
+        self.instrumentation = INSTRUMENTATION
+        self.retry_policy = RetryPolicy(max_retries=self.PLAID_MAX_RETRIES)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    def format_error(self, e):
+        return plaid_interface.format_error(self, e)
+
+    async def get_accounts(self, access_token=None):
+        """
+        /accounts/get.  an open circuit comes back as the CIRCUIT_OPEN error
+        dict (there is no response cache to serve from here)
+        """
+        try:
+            return await self._post('/accounts/get', {'access_token': access_token or self.ACCESS_TOKEN})
+        except plaid.ApiException as e:
+            return self.format_error(e)
+        except CircuitOpenError as e:
+            return plaid_interface._circuit_open_error(e)
+
+    async def get_balance(self, access_token=None):
+        """
+        /accounts/balance/get, CIRCUIT_OPEN error dict while its circuit is open
+        """
+        try:
+            return await self._post('/accounts/balance/get', {'access_token': access_token or self.ACCESS_TOKEN})
+        except plaid.ApiException as e:
+            return self.format_error(e)
+        except CircuitOpenError as e:
+            return plaid_interface._circuit_open_error(e)
+
+    async def get_transactions_from_plaid(self, start=None, end=None, page_size=None, access_token=None):
+        """
+        retrieves every transaction between start and end.  the first page
+        reports total_transactions, the remaining pages are then requested
+        together
+        """
+        if start is None:
+            return None
+        page_size = min(page_size or self.PLAID_PAGE_SIZE, PLAID_MAX_PAGE_SIZE)
+        access_token = access_token or self.ACCESS_TOKEN
+
+        response = await self._request_transactions_page(access_token, start, end, 0, page_size)
+        offsets = range(len(response['transactions']), response['total_transactions'], page_size)
+        if response['transactions'] and offsets:
+            pages = await asyncio.gather(*[
+                self._request_transactions_page(access_token, start, end, offset, page_size) for offset in offsets
+            ], return_exceptions=True)
+            for page in pages:
+                if isinstance(page, BaseException):
+                    raise page
+                response['transactions'].extend(page['transactions'])
+        return response
+
+    async def get_account_history(self, option='m', periods=1, max_in_flight=None, access_token=None):
+        """
+        same windows, dedupe and decoded frame as
+        plaid_interface.get_account_history(use_store=False), with up to
+        max_in_flight windows awaited at once.  like the sync client, a
+        window failing on an unhealthy endpoint (5xx, timeouts, open circuit)
+        is skipped with a warning; any other error is raised once every
+        window has finished
+        """
+        from transaction_decoder import decode_transactions
+
+        date_range = plaid_interface.get_date_range(periods=periods, option=option)
+        windows = plaid_interface.plan_query_windows(date_range, option=option)
+        in_flight = asyncio.Semaphore(max_in_flight or self.PLAID_MAX_IN_FLIGHT)
+
+        async def fetch_window(start, end):
+            async with in_flight:
+                try:
+                    return await self.get_transactions_from_plaid(start=start, end=end, access_token=access_token)
+                except Exception as e:
+                    if not is_endpoint_failure(e):
+                        raise
+                    logger.warning('skipping window %s..%s: %s', start, end, e)
+                    return None
+
+        # return_exceptions so a failing window never leaves its siblings
+        # running behind the caller's back
+        history_concat_list = await asyncio.gather(*[fetch_window(start, end) for start, end in windows],
+                                                   return_exceptions=True)
+        for result in history_concat_list:
+            if isinstance(result, BaseException):
+                raise result
+        return decode_transactions(plaid_interface.dedupe_transactions(history_concat_list))
+
+    async def _request_transactions_page(self, access_token, start, end, offset, count):
+        return await self._post('/transactions/get', {
+            'access_token': access_token,
+            'start_date': str(start),
+            'end_date': str(end),
+            'options': {'count': count, 'offset': offset}
+        })
+
+    async def _post(self, path, body):
+        """
+        the awaitable twin of plaid_interface.call: same token buckets,
+        same circuit breakers, same retry policy and instrumentation,
+        sleeping on the event loop instead of the thread
+        """
+        endpoint = path.strip('/').replace('/', '_')
+        item = token_key(body['access_token']) if body.get('access_token') else None
+        body = dict(body, client_id=self.PLAID_CLIENT_ID, secret=self.PLAID_SECRET)
+        breaker = self.circuit_breakers[endpoint]
+        attempt = 0
+        with self.instrumentation.span('endpoint', endpoint) as span:
+            while True:
+                probe = breaker.before_call()
+                try:
+                    wait = self.rate_limiter.acquire(endpoint, item)
+                    if wait:
+                        await asyncio.sleep(wait)
+                    if span:
+                        span.retries = attempt
+                    response = await self.http.post(path, json=body)
+                except Exception as e:
+                    if is_endpoint_failure(e):
+                        breaker.record_failure()
+                    elif probe:
+                        breaker.release()
+                    raise
+                except BaseException:
+                    # cancelled: a half open probe must not stay claimed
+                    if probe:
+                        breaker.release()
+                    raise
+                if response.status_code < 400:
+                    breaker.record_success()
+                    self.rate_limiter.reward(endpoint, item)
+                    result = json.loads(response.content)
+                    if span:
+                        span.rows = response_rows(result)
+                        span.bytes = len(response.content)
+                    return result
+
+                e = plaid.ApiException(status=response.status_code, reason=response.reason_phrase)
+                e.body = response.content
+                e.headers = dict(response.headers)
+                if is_endpoint_failure(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if is_rate_limited(e):
+                    self.rate_limiter.penalize(endpoint, item)
+                delay = self.retry_policy.retry_delay(e, attempt)
+                if delay is None:
+                    raise e
+                attempt += 1
+                await asyncio.sleep(delay)
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+# one user rule.  merchant is a regex searched in the merchant text (case
+# insensitive unless the engine says otherwise), amounts are inclusive
+# dollar bounds on plaid's signed amount (positive = money out) and
+# account_ids limits the rule to some accounts.  None means no condition.
+# the first rule in the list whose conditions all hold wins
+Rule = namedtuple('Rule', ['category', 'merchant', 'min_amount', 'max_amount', 'account_ids'],
+                  defaults=(None, None, None, None))
+
+# columns the merchant text is read from, first non-missing value wins
+TEXT_COLUMNS = ('merchant_name', 'name')
+
+# rule index of rows no rule matched
+NO_MATCH = -1
+
+NUMBERED_BACKREFERENCE = re.compile(r'\\[1-9]|\\g<\d')
+
+
+def load_rules(rules):
+    """
+    Rule tuples from Rules or dicts with the same keys
+    """
+    return [rule if isinstance(rule, Rule) else Rule(**rule) for rule in rules]
+
+
+def rules_fingerprint(rules, ignore_case=True):
+    """
+    stable hash of a rule list, changing whenever any rule or their order
+    does
+    """
+    payload = json.dumps([[rule.category, rule.merchant, rule.min_amount, rule.max_amount,
+                           sorted(rule.account_ids) if rule.account_ids is not None else None]
+                          for rule in rules] + [ignore_case], default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Categorizer():
+    """
+    applies a list of Rules to transaction frames (decode_transactions
+    layout) without a python loop over rows.  the merchant text is
+    factorized so every regex runs once per distinct merchant, never per
+    row:
+
+    - rules with only a merchant regex are compiled into one combined
+      pattern, an ordered alternation of lookaheads, whose first successful
+      branch is the first rule in list order that matches.  one match()
+      per distinct merchant gives its rule, spread to the rows through the
+      factorized codes
+    - rules with amount or account conditions are evaluated as numpy masks
+      over just the rows of the merchants their regex matched
+
+    each row gets the lower of the two rule indexes.  results are cached per
+    transaction_id together with a hash of the row's merchant text, amount
+    and account, and the whole cache is dropped when the rules change, so a
+    repeat call only categorizes new or modified transactions
+    """
+
+    def __init__(self, rules=(), ignore_case=True):
+        self.ignore_case = ignore_case
+        self.fingerprint = None
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        """
+        replaces the rules, compiling them and dropping every cached result
+        if they differ from the current ones
+        """
+        rules = load_rules(rules)
+        fingerprint = rules_fingerprint(rules, self.ignore_case)
+        if fingerprint == self.fingerprint:
+            return
+        flags = re.IGNORECASE if self.ignore_case else 0
+        patterns = {}
+        for index, rule in enumerate(rules):
+            if rule.merchant is not None:
+                try:
+                    patterns[index] = re.compile(rule.merchant, flags)
+                except re.error as e:
+                    raise ValueError('rule %d (%s): bad merchant pattern %r: %s'
+                                     % (index, rule.category, rule.merchant, e)) from None
+
+        self.rules = rules
+        self.fingerprint = fingerprint
+        self.categories = pd.Index(pd.unique(pd.Series([rule.category for rule in rules], dtype=object)))
+        self.rule_categories = self.categories.get_indexer([rule.category for rule in rules])
+        self.patterns = patterns
+        self.conditional = [index for index, rule in enumerate(rules) if _has_row_conditions(rule)
+                            or rule.merchant is None]
+        conditional = set(self.conditional)
+        self.combined = self._combine([index for index in patterns if index not in conditional])
+        self.clear_cache()
+
+    def clear_cache(self):
+        # transaction_id -> (row hash, rule index), as parallel arrays
+        self.cached_ids = pd.Index([], dtype=object)
+        self.cached_hashes = np.zeros(0, dtype=np.uint64)
+        self.cached_rules = np.zeros(0, dtype=np.int64)
+
+    def _combine(self, indexes):
+        """
+        one pattern whose branch k succeeds when rule indexes[k]'s regex
+        matches anywhere in the text.  branches are tried in order at
+        position 0, so match().lastgroup names the first matching rule
+        """
+        if not indexes:
+            return None
+        # the engine's flag goes inline so it stays scoped to each branch
+        scope = '?i:' if self.ignore_case else '?:'
+        branches = ['(?=[\\s\\S]*?(%s%s))(?P<r%d>)' % (scope, self.rules[index].merchant, index) for index in indexes]
+        sequential = _Sequential([(index, self.patterns[index]) for index in indexes])
+        # joined, numbered backreferences would point at other branches' groups
+        if any(NUMBERED_BACKREFERENCE.search(self.rules[index].merchant) for index in indexes):
+            return sequential
+        try:
+            return re.compile('|'.join(branches))
+        except re.error:
+            # e.g. the same group name in two rules
+            return sequential
+
+    def rule_indexes(self, frame):
+        """
+        index into self.rules of the rule each row matched, NO_MATCH for none
+        """
+        if not len(frame):
+            return np.zeros(0, dtype=np.int64)
+        ids = frame['transaction_id']
+        cents = frame['amount_cents'].to_numpy(dtype=np.int64)
+        hashes = _row_hashes(frame)
+
+        position = self.cached_ids.get_indexer(ids)
+        hit = position >= 0
+        hit[hit] = self.cached_hashes[position[hit]] == hashes[hit]
+        result = np.full(len(frame), NO_MATCH, dtype=np.int64)
+        result[hit] = self.cached_rules[position[hit]]
+
+        missing = np.flatnonzero(~hit)
+        if len(missing):
+            result[missing] = self._evaluate(self._text(frame.iloc[missing]), cents[missing],
+                                             frame['account_id'].iloc[missing])
+            # modified rows are overwritten in place, new ids appended
+            stale = missing[position[missing] >= 0]
+            self.cached_hashes[position[stale]] = hashes[stale]
+            self.cached_rules[position[stale]] = result[stale]
+            new = missing[position[missing] < 0]
+            new = new[~pd.Index(ids.iloc[new]).duplicated(keep='last')]
+            if len(new):
+                self.cached_ids = self.cached_ids.append(pd.Index(ids.iloc[new], dtype=object))
+                self.cached_hashes = np.concatenate([self.cached_hashes, hashes[new]])
+                self.cached_rules = np.concatenate([self.cached_rules, result[new]])
+        return result
+
+    def categorize(self, frame):
+        """
+        the category of each row's first matching rule as a categorical
+        Series aligned with frame, missing where no rule matched
+        """
+        indexes = self.rule_indexes(frame)
+        # NO_MATCH picks the trailing -1, a missing category
+        codes = np.append(self.rule_categories, -1)[indexes]
+        return pd.Series(pd.Categorical.from_codes(codes, categories=self.categories), index=frame.index,
+                         name='budget_category')
+
+    def _text(self, frame):
+        text = None
+        for column in TEXT_COLUMNS:
+            if column in frame.columns:
+                values = frame[column].astype(object)
+                text = values if text is None else text.where(text.notna(), values)
+        if text is None:
+            return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+        return text
+
+    def _evaluate(self, text, cents, account_ids):
+        codes, merchants = pd.factorize(text)
+        merchants = merchants.astype(str).tolist()
+        best = np.full(len(codes), len(self.rules), dtype=np.int64)
+
+        if self.combined is not None:
+            first = np.array([_first_rule(self.combined, merchant) for merchant in merchants], dtype=np.int64)
+            # missing text has code -1, which picks the trailing no-match
+            best = np.append(np.where(first >= 0, first, len(self.rules)), len(self.rules))[codes]
+
+        if self.conditional:
+            # rows grouped by merchant so a rule only looks at the rows its
+            # regex matched
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(merchants) + 1))
+            account_codes, accounts = pd.factorize(pd.Series(account_ids).astype(object))
+            for index in self.conditional:
+                rule = self.rules[index]
+                if rule.merchant is None:
+                    rows = np.arange(len(codes))
+                else:
+                    pattern = self.patterns[index]
+                    matched = np.flatnonzero([pattern.search(merchant) is not None for merchant in merchants])
+                    rows = order[_ranges(bounds[matched], bounds[matched + 1])]
+                rows = rows[best[rows] > index]
+                if rule.min_amount is not None:
+                    rows = rows[cents[rows] >= round(rule.min_amount * 100)]
+                if rule.max_amount is not None:
+                    rows = rows[cents[rows] <= round(rule.max_amount * 100)]
+                if rule.account_ids is not None:
+                    allowed = accounts.get_indexer(list(rule.account_ids))
+                    rows = rows[np.isin(account_codes[rows], allowed[allowed >= 0])]
+                best[rows] = index
+
+        return np.where(best < len(self.rules), best, NO_MATCH)
+
+
+class _Sequential():
+    """
+    stand-in for the combined pattern when the regexes cannot be joined:
+    tries them one at a time, in order
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+
+    def first(self, text):
+        for index, pattern in self.patterns:
+            if pattern.search(text):
+                return index
+        return None
+
+
+def _first_rule(combined, text):
+    if isinstance(combined, _Sequential):
+        index = combined.first(text)
+        return -1 if index is None else index
+    match = combined.match(text)
+    return int(match.lastgroup[1:]) if match else -1
+
+
+def _has_row_conditions(rule):
+    return rule.min_amount is not None or rule.max_amount is not None or rule.account_ids is not None
+
+
+def _ranges(starts, ends):
+    """
+    concatenated np.arange(start, end) for every pair, without a loop
+    """
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+def _row_hashes(frame):
+    """
+    uint64 per row over everything a rule looks at, so a modified
+    transaction is re-categorized even though its id is unchanged
+    """
+    columns = [column for column in TEXT_COLUMNS if column in frame.columns] + ['amount_cents', 'account_id']
+    return pd.util.hash_pandas_object(frame[columns], index=False).to_numpy()
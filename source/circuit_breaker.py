@@ -0,0 +1,131 @@
+import sys
+import threading
+import time
+
+from rate_limiting import plaid_error
+
+
+# plaid answering with one of these means the endpoint itself is degraded
+DEGRADED_ERROR_CODES = {'INTERNAL_SERVER_ERROR', 'PLANNED_MAINTENANCE'}
+
+
+class CircuitOpenError(Exception):
+    """
+    raised instead of calling an endpoint whose circuit is open
+    """
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__('%s circuit is open, next probe in %.1fs' % (endpoint, retry_in))
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+def is_endpoint_failure(e):
+    """
+    true for errors that say the endpoint is unhealthy (timeouts, dropped
+    connections, 5xx) as opposed to a problem with one request or item
+    """
+    if isinstance(e, CircuitOpenError):
+        return True
+    if is_api_exception(e):
+        _, error_code = plaid_error(e)
+        return (e.status or 0) >= 500 or error_code in DEGRADED_ERROR_CODES
+    return isinstance(e, OSError) or type(e).__module__.startswith(('urllib3', 'httpx', 'httpcore'))
+
+
+def is_api_exception(e):
+    """
+    isinstance(e, plaid.ApiException) without importing plaid: if plaid was
+    never loaded, e cannot be one of its exceptions
+    """
+    plaid = sys.modules.get('plaid')
+    return plaid is not None and isinstance(e, plaid.ApiException)
+
+
+class CircuitBreaker():
+    """
+    closed -> open after failure_threshold consecutive endpoint failures.
+    while open every call fails fast with CircuitOpenError; after
+    reset_timeout seconds one probe call is let through (half open) and its
+    outcome closes or re-opens the circuit.  a probe that never reports back
+    (cancelled, or lost) is given up on after another reset_timeout
+    """
+
+    def __init__(self, endpoint, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.probe_started = None
+
+    def before_call(self):
+        """
+        raises CircuitOpenError if the call may not go ahead, otherwise
+        returns whether it is the half open probe
+        """
+        with self.lock:
+            if self.state == 'closed':
+                return False
+            if self.state == 'open':
+                retry_in = self.opened_at + self.reset_timeout - self.clock()
+                if retry_in > 0:
+                    raise CircuitOpenError(self.endpoint, retry_in)
+                self.state = 'half_open'
+                self.probing = False
+            now = self.clock()
+            if self.probing:
+                retry_in = self.probe_started + self.reset_timeout - now
+                if retry_in > 0:
+                    raise CircuitOpenError(self.endpoint, retry_in)
+            self.probing = True
+            self.probe_started = now
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probing = False
+
+    def release(self):
+        """
+        for a probe that ended without an outcome (cancelled, interrupted):
+        re-opens the circuit so the next probe is let through after
+        reset_timeout
+        """
+        with self.lock:
+            if self.probing:
+                self.state = 'open'
+                self.opened_at = self.clock()
+                self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = self.clock()
+                self.probing = False
+
+
+class CircuitBreakers():
+    """
+    one CircuitBreaker per endpoint, created on first use
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def __getitem__(self, endpoint):
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+            return self.breakers[endpoint]
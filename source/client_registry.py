@@ -0,0 +1,83 @@
+import hashlib
+import socket
+import threading
+
+import plaid
+from plaid.api import plaid_api
+from urllib3.connection import HTTPConnection
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_payload = threading.local()
+
+
+class MeteredApiClient(plaid.ApiClient):
+    """
+    ApiClient that notes the size of the last response body it read on each
+    thread, see last_payload_size
+    """
+
+    def request(self, *args, **kwargs):
+        response = super().request(*args, **kwargs)
+        _payload.size = len(response.data or b'')
+        return response
+
+
+def last_payload_size():
+    """
+    bytes in the body of the last successful plaid response read on this
+    thread, None before the first one
+    """
+    return getattr(_payload, 'size', None)
+
+
+def get_plaid_client(host, client_id, secret, pool_size=32, keepalive_idle=60):
+    """
+    returns the process-wide (ApiClient, PlaidApi) pair for an environment,
+    credentials and pool settings, creating it on first use.  every
+    plaid_interface built with the same settings reuses its urllib3 pool,
+    so warm keep-alive connections survive short-lived instances.
+    keepalive_idle turns on tcp keepalive probes after that many idle
+    seconds so pooled connections are not silently dropped by middleboxes
+    """
+    key = (host, client_id, hashlib.sha256((secret or '').encode('utf-8')).hexdigest(), pool_size, keepalive_idle)
+    with _clients_lock:
+        if key not in _clients:
+            configuration = plaid.Configuration(
+                host=host,
+                api_key={
+                    'clientId': client_id,
+                    'secret': secret,
+                    'plaidVersion': '2020-09-14'
+                }
+            )
+            configuration.connection_pool_maxsize = pool_size
+            configuration.socket_options = keepalive_socket_options(keepalive_idle)
+            api_client = MeteredApiClient(configuration)
+            _clients[key] = (api_client, plaid_api.PlaidApi(api_client))
+        return _clients[key]
+
+
+def close_plaid_clients():
+    """
+    closes and forgets every shared client, e.g. before a worker forks
+    """
+    with _clients_lock:
+        for api_client, _ in _clients.values():
+            api_client.close()
+            api_client.rest_client.pool_manager.clear()
+        _clients.clear()
+
+
+def keepalive_socket_options(idle):
+    options = list(HTTPConnection.default_socket_options)
+    if not idle:
+        return options
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    # the idle/interval knobs are platform specific
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, int(idle)))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(idle) // 4)))
+    return options
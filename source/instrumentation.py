@@ -0,0 +1,244 @@
+import bisect
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from rate_limiting import plaid_error
+
+
+logger = logging.getLogger(__name__)
+
+# one finished plaid endpoint call (kind 'endpoint') or pipeline stage (kind
+# 'stage').  fields that do not apply are None
+Measurement = namedtuple('Measurement', ['kind', 'name', 'seconds', 'rows', 'bytes', 'retries', 'error_code'])
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Instrumentation():
+    """
+    hands a Measurement to every registered exporter, any callable taking
+    one argument.  with no exporters span() returns a shared no-op span, so
+    instrumented code pays one attribute lookup and nothing else
+    """
+
+    def __init__(self, exporters=()):
+        self.lock = threading.Lock()
+        self.exporters = tuple(exporters)
+
+    @property
+    def enabled(self):
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter):
+        with self.lock:
+            self.exporters = self.exporters + (exporter,)
+        return exporter
+
+    def remove_exporter(self, exporter):
+        with self.lock:
+            self.exporters = tuple(existing for existing in self.exporters if existing is not exporter)
+
+    def span(self, kind, name):
+        """
+        context manager timing one endpoint call or stage.  set rows, bytes,
+        retries or error_code on it before it exits; an exception leaving the
+        block is recorded as its error_code
+        """
+        if not self.exporters:
+            return NULL_SPAN
+        return Span(self, kind, name)
+
+    def emit(self, measurement):
+        for exporter in self.exporters:
+            try:
+                exporter(measurement)
+            except Exception:
+                logger.exception('metrics exporter %r failed', exporter)
+
+
+class Span():
+    __slots__ = ('instrumentation', 'kind', 'name', 'rows', 'bytes', 'retries', 'error_code', 'started')
+
+    def __init__(self, instrumentation, kind, name):
+        self.instrumentation = instrumentation
+        self.kind = kind
+        self.name = name
+        self.rows = None
+        self.bytes = None
+        self.retries = None
+        self.error_code = None
+
+    def __bool__(self):
+        return True
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        if exc is not None and self.error_code is None:
+            self.error_code = error_code(exc)
+        self.instrumentation.emit(Measurement(
+            self.kind, self.name, seconds, self.rows, self.bytes, self.retries, self.error_code))
+        return False
+
+
+class _NullSpan():
+    """
+    what span() hands out while nothing is listening.  falsy, so callers can
+    skip work that only feeds the measurement with `if span:`
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def error_code(e):
+    """
+    plaid's error_code for an ApiException, the exception class name for
+    anything else
+    """
+    if getattr(e, 'body', None) is not None:
+        _, code = plaid_error(e)
+        if code:
+            return code
+    return type(e).__name__
+
+
+def response_rows(response):
+    """
+    number of records a plaid response carries: transactions, sync changes
+    or accounts, whichever the endpoint returns
+    """
+    for fields in (('transactions',), ('added', 'modified', 'removed'), ('accounts',)):
+        counts = [len(response[field]) for field in fields if field in response]
+        if counts:
+            return sum(counts)
+    return None
+
+
+class HistogramSummary():
+    """
+    exporter keeping a fixed-bucket latency histogram and running totals of
+    rows, bytes, retries and errors per (kind, name), in memory
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def __call__(self, measurement):
+        key = (measurement.kind, measurement.name)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    'counts': [0] * (len(self.buckets) + 1),
+                    'count': 0, 'seconds': 0.0, 'rows': 0, 'bytes': 0, 'retries': 0, 'errors': {}
+                }
+            series['counts'][bisect.bisect_left(self.buckets, measurement.seconds)] += 1
+            series['count'] += 1
+            series['seconds'] += measurement.seconds
+            series['rows'] += measurement.rows or 0
+            series['bytes'] += measurement.bytes or 0
+            series['retries'] += measurement.retries or 0
+            if measurement.error_code is not None:
+                series['errors'][measurement.error_code] = series['errors'].get(measurement.error_code, 0) + 1
+
+    def quantile(self, counts, q):
+        """
+        estimates the q quantile from bucket counts, interpolating linearly
+        inside the bucket it falls in
+        """
+        target = q * sum(counts)
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= target:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return low + (high - low) * (target - seen) / count
+            seen += count
+        return 0.0
+
+    def summary(self):
+        """
+        {(kind, name): count, mean, p50, p95, p99 seconds and the totals}
+        """
+        with self.lock:
+            series = {key: dict(value, counts=list(value['counts']), errors=dict(value['errors']))
+                      for key, value in self.series.items()}
+        return {
+            key: {
+                'count': value['count'],
+                'mean': value['seconds'] / value['count'],
+                'p50': self.quantile(value['counts'], 0.5),
+                'p95': self.quantile(value['counts'], 0.95),
+                'p99': self.quantile(value['counts'], 0.99),
+                'rows': value['rows'],
+                'bytes': value['bytes'],
+                'retries': value['retries'],
+                'errors': value['errors'],
+            }
+            for key, value in series.items()
+        }
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+
+class PrometheusExporter(HistogramSummary):
+    """
+    HistogramSummary that renders itself in the prometheus text exposition
+    format, e.g. for a /metrics handler or the node_exporter textfile
+    collector
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='wealthbuilder'):
+        super().__init__(buckets)
+        self.prefix = prefix
+
+    def render(self):
+        with self.lock:
+            series = sorted(self.series.items())
+        lines = []
+        for kind in sorted({kind for kind, _ in (key for key, _ in series)}):
+            metric = '%s_%s' % (self.prefix, kind)
+            rows = [(name, value) for (series_kind, name), value in series if series_kind == kind]
+            lines += ['# HELP %s_seconds plaid %s latency' % (metric, kind),
+                      '# TYPE %s_seconds histogram' % metric]
+            for name, value in rows:
+                label = '%s="%s"' % (kind, _escape(name))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), value['counts']):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append('%s_seconds_bucket{%s,le="%s"} %d' % (metric, label, le, cumulative))
+                lines.append('%s_seconds_sum{%s} %r' % (metric, label, value['seconds']))
+                lines.append('%s_seconds_count{%s} %d' % (metric, label, value['count']))
+            for total in ('rows', 'bytes', 'retries'):
+                lines += ['# TYPE %s_%s_total counter' % (metric, total)]
+                lines += ['%s_%s_total{%s="%s"} %d' % (metric, total, kind, _escape(name), value[total])
+                          for name, value in rows]
+            lines += ['# TYPE %s_errors_total counter' % metric]
+            lines += ['%s_errors_total{%s="%s",error_code="%s"} %d' % (metric, kind, _escape(name), _escape(code), count)
+                      for name, value in rows for code, count in sorted(value['errors'].items())]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
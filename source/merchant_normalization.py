@@ -0,0 +1,95 @@
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# (what it strips, pattern, replacement), applied in order to the upper
+# cased name.  anything that changes here changes PIPELINE_VERSION, so names
+# cleaned by an older pipeline are cleaned again rather than read back.
+# after a prefix only whole date and 4+ digit tokens go, so the 7 of
+# 7-ELEVEN or the 24 of 24 HOUR FITNESS stay with the merchant
+CLEANING_STEPS = [
+    ('card network and pos prefixes', re.compile(
+        r'^(?:(?:POS|DEBIT|CHECKCARD|CHECK CARD|VISA|DDA|PUR|PURCHASE|ACH|RECURRING|PREAUTHORIZED|'
+        r'AUTHORIZED ON)\b(?:\s+|(?:\d+[/-][\d/-]*|\d{4,})(?=\s))*)+(?=\S)'), ''),
+    ('payment processor prefixes', re.compile(r'^(?:SQ|TST|DD|PP|SP|PAYPAL|IN|BT|CKE|GOOGLE|APL)\s?\*\s*'), ''),
+    ('descriptor after a star', re.compile(r'\s*\*.*$'), ''),
+    ('dates', re.compile(r'\b\d{1,4}[/-]\d{1,2}(?:[/-]\d{2,4})?\b'), ' '),
+    ('times', re.compile(r'\b\d{1,2}(?::\d{2})?\s?(?:AM|PM)\b'), ' '),
+    ('masked card numbers', re.compile(r'\b(?:X+|\*+)\d{2,4}\b'), ' '),
+    ('store numbers', re.compile(r'(?:#\s*|\bNO\.?\s*|\bSTORE\s+|\bSTE\s+)\d+\b|\b[A-Z]?-?(?:\d{4,}|0\d{2})\b'), ' '),
+    ('punctuation', re.compile(r"[^\w\s&'.]|(?<!\w)[.']|[.'](?!\w)|_"), ' '),
+    ('whitespace', re.compile(r'\s+'), ' '),
+]
+
+PIPELINE_VERSION = hashlib.sha256(
+    repr([(pattern.pattern, replacement) for _, pattern, replacement in CLEANING_STEPS]).encode('utf-8')
+).hexdigest()[:16]
+
+
+def clean_name(raw):
+    """
+    canonical merchant for one raw plaid name: prefixes, store numbers,
+    dates and card digits stripped, words capitalized.  None when nothing
+    is left
+    """
+    if raw is None or raw != raw:
+        return None
+    name = str(raw).upper()
+    for _, pattern, replacement in CLEANING_STEPS:
+        name = pattern.sub(replacement, name)
+    name = name.strip()
+    if not name:
+        return None
+    return ' '.join(word[:1] + word[1:].lower() for word in name.split(' '))
+
+
+class MerchantNormalizer():
+    """
+    maps raw names to canonical merchants through a hash index (a dict in
+    memory, backed by the store's merchant_names table when a store is
+    given, so it outlives the process).  normalize() factorizes the column
+    and only looks at its distinct values: known ones come out of the
+    index, new ones go through clean_name once and are added to it, and the
+    rows are filled in through the factorized codes
+    """
+
+    def __init__(self, store=None, aliases=None):
+        self.store = store
+        # canonical merchant -> preferred spelling, applied after cleaning
+        self.aliases = dict(aliases or {})
+        self.index = {}
+
+    def canonical(self, raws):
+        """
+        canonical merchant of each distinct raw name in raws, as a list
+        """
+        raws = [str(raw) for raw in raws]
+        missing = [raw for raw in raws if raw not in self.index]
+        if missing and self.store is not None:
+            self.index.update(self.store.get_merchant_names(missing, PIPELINE_VERSION))
+            missing = [raw for raw in missing if raw not in self.index]
+        if missing:
+            cleaned = {raw: clean_name(raw) for raw in missing}
+            if self.store is not None:
+                self.store.put_merchant_names(cleaned, PIPELINE_VERSION)
+            self.index.update(cleaned)
+        return [self.aliases.get(self.index[raw], self.index[raw]) for raw in raws]
+
+    def normalize(self, names):
+        """
+        canonical merchant for every row of a Series of raw names, as a
+        categorical Series with the same index
+        """
+        if isinstance(names.dtype, pd.CategoricalDtype):
+            codes, raws = names.cat.codes.to_numpy(), names.cat.categories
+        else:
+            codes, raws = pd.factorize(names)
+        merchant_codes, merchants = pd.factorize(pd.Series(self.canonical(raws), dtype=object), sort=True)
+        # names that clean to nothing and missing names (code -1, which picks
+        # the trailing -1) stay missing
+        codes = np.append(merchant_codes, -1)[codes]
+        return pd.Series(pd.Categorical.from_codes(codes, categories=merchants), index=names.index,
+                         name='merchant')
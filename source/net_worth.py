@@ -0,0 +1,153 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from spending_aggregation import period_starts
+
+
+# plaid reports the balance of these as the amount owed: they count against
+# net worth and a purchase (positive amount) raises the balance
+LIABILITY_TYPES = ('credit', 'loan')
+
+
+class BalanceSeries():
+    """
+    daily end of day balances in cents, balances[i, j] being account
+    account_ids[i] on dates[j].  liabilities hold the amount owed and have
+    sign -1, everything else +1, so net_worth = signs @ balances.  the arrays
+    are computed once; between() and resample() for a chart only slice them
+    """
+
+    def __init__(self, dates, account_ids, balances, signs):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.account_ids = list(account_ids)
+        self.balances = np.asarray(balances, dtype=np.int64).reshape(len(self.account_ids), len(self.dates))
+        self.signs = np.asarray(signs, dtype=np.int64)
+        self.net_worth = self.signs @ self.balances
+
+    def __len__(self):
+        return len(self.dates)
+
+    def between(self, start=None, end=None):
+        """
+        the days start <= date <= end (inclusive, either end optional)
+        """
+        low = 0 if start is None else np.searchsorted(self.dates, np.datetime64(start, 'D'))
+        high = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right')
+        return BalanceSeries(self.dates[low:high], self.account_ids, self.balances[:, low:high], self.signs)
+
+    def resample(self, period='month'):
+        """
+        one point per day, monday-based week or month: its last day in the
+        series, dated as that day
+        """
+        starts = period_starts(self.dates, period)
+        last = np.flatnonzero(np.r_[starts[1:] != starts[:-1], True]) if len(starts) else starts.astype(np.int64)
+        return BalanceSeries(self.dates[last], self.account_ids, self.balances[:, last], self.signs)
+
+    def to_frame(self):
+        """
+        DataFrame indexed by date, one cents column per account plus net_worth
+        """
+        frame = pd.DataFrame(self.balances.T, index=pd.DatetimeIndex(self.dates, name='date'),
+                             columns=self.account_ids)
+        frame['net_worth'] = self.net_worth
+        return frame
+
+    def save(self, path):
+        """
+        writes the arrays to an .npz file that load() maps straight back
+        """
+        np.savez(path, dates=self.dates, account_ids=np.array(self.account_ids, dtype=str),
+                 balances=self.balances, signs=self.signs)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(arrays['dates'], arrays['account_ids'].tolist(), arrays['balances'], arrays['signs'])
+
+
+def account_signs(accounts):
+    """
+    -1 for liability accounts, +1 for the rest, in the order given.
+    accounts are plaid account dicts or models
+    """
+    return np.array([-1 if str(account['type']) in LIABILITY_TYPES else 1 for account in accounts], dtype=np.int64)
+
+
+def reconstruct_balances(transactions, accounts, as_of=None, start=None, include_pending=False):
+    """
+    back-fills daily balances from the current ones: walking back from
+    as_of (default today, the day the balances were read), each day's
+    balance is the current one plus everything the account spent after
+    that day, or minus it for liabilities.  one bincount buckets the
+    transaction frame (decode_transactions layout) per account and day and
+    a reversed cumsum turns the buckets into the running totals.  the
+    series starts at start or, without one (None or NaT), the oldest
+    transaction.  transactions of accounts not in accounts, after as_of or
+    pending (unless include_pending; plaid's current balance mostly leaves
+    them out) are ignored.  currencies are not converted
+    """
+    account_ids = [account['account_id'] for account in accounts]
+    current = np.array([_cents(account['balances']['current']) for account in accounts], dtype=np.int64)
+    signs = account_signs(accounts)
+    as_of = np.datetime64(as_of or date.today(), 'D')
+
+    days = np.asarray(transactions['date'], dtype='datetime64[D]')
+    codes = pd.Index(account_ids).get_indexer(transactions['account_id'])
+    selected = (codes >= 0) & (days <= as_of)
+    if not include_pending and 'pending' in transactions.columns:
+        selected &= ~transactions['pending'].to_numpy(dtype=bool, na_value=False)
+    # a NaT start (the min of an empty date range) is no lower bound either
+    if start is None or pd.isna(start):
+        start = days[selected].min() if selected.any() else as_of
+    start = min(np.datetime64(start, 'D'), as_of)
+    selected &= days >= start
+
+    width = int((as_of - start).astype(np.int64)) + 1
+    slots = codes[selected] * width + (days[selected] - start).astype(np.int64)
+    daily = np.bincount(slots, weights=transactions['amount_cents'].to_numpy()[selected],
+                        minlength=len(account_ids) * width).reshape(len(account_ids), width)
+    # spent after each day: suffix sums, minus the day itself
+    after = np.rint(np.cumsum(daily[:, ::-1], axis=1)[:, ::-1] - daily).astype(np.int64)
+    balances = current[:, None] + signs[:, None] * after
+    return BalanceSeries(np.arange(start, as_of + 1), account_ids, balances, signs)
+
+
+def snapshot_series(snapshots, accounts=None):
+    """
+    BalanceSeries of what /accounts/balance/get actually reported, from
+    TransactionStore.get_balance_snapshots rows: the last snapshot of each
+    day, carried forward over days without one (0 before an account's
+    first).  signs come from accounts, or the type stored with each row
+    """
+    frame = pd.DataFrame(snapshots, columns=['account_id', 'captured_at', 'current', 'type'])
+    if accounts is not None:
+        account_ids, signs = [account['account_id'] for account in accounts], account_signs(accounts)
+    else:
+        types = frame.drop_duplicates('account_id', keep='last')
+        account_ids = types['account_id'].tolist()
+        signs = account_signs([{'type': kind} for kind in types['type']])
+    codes = pd.Index(account_ids).get_indexer(frame['account_id'])
+    frame = frame[codes >= 0]
+    codes = codes[codes >= 0]
+    if not len(frame):
+        return BalanceSeries([], account_ids, np.zeros((len(account_ids), 0)), signs)
+
+    days = pd.to_datetime(frame['captured_at']).to_numpy().astype('datetime64[D]')
+    start = days.min()
+    width = int((days.max() - start).astype(np.int64)) + 1
+    slots = codes * width + (days - start).astype(np.int64)
+    # rows come ordered by captured_at, so the last write to a slot wins
+    grid = np.full(len(account_ids) * width, -1, dtype=np.int64)
+    grid[slots] = np.arange(len(slots))
+    # carry each slot's row index forward along its account's row
+    grid = np.maximum.accumulate(grid.reshape(len(account_ids), width), axis=1)
+    cents = np.array([_cents(value) for value in frame['current']], dtype=np.int64)
+    balances = np.where(grid >= 0, cents[grid], 0)
+    return BalanceSeries(np.arange(start, start + width), account_ids, balances, signs)
+
+
+def _cents(amount):
+    return 0 if amount is None or amount != amount else int(round(amount * 100))
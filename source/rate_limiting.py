@@ -0,0 +1,150 @@
+import json
+import random
+import threading
+import time
+
+
+# error_type RATE_LIMIT_EXCEEDED is always retried; these codes are too
+RETRYABLE_ERROR_CODES = {
+    'PRODUCT_NOT_READY',
+    'INTERNAL_SERVER_ERROR',
+    'PLANNED_MAINTENANCE',
+    'INSTITUTION_DOWN',
+    'INSTITUTION_NOT_RESPONDING',
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def plaid_error(e):
+    """
+    returns (error_type, error_code) from a plaid.ApiException body, or
+    (None, None) when the body is not plaid's json error
+    """
+    try:
+        body = json.loads(e.body)
+        return body.get('error_type'), body.get('error_code')
+    except (TypeError, ValueError, AttributeError):
+        return None, None
+
+
+def is_rate_limited(e):
+    error_type, _ = plaid_error(e)
+    return error_type == 'RATE_LIMIT_EXCEEDED' or e.status == 429
+
+
+class TokenBucket():
+    """
+    token bucket whose refill rate adapts to the server: penalize() halves
+    it after a rate limit error and reward() creeps it back towards
+    max_rate after each success
+    """
+
+    def __init__(self, rate, capacity, min_rate=None, clock=time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 32
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        takes one token and returns how many seconds the caller must wait
+        before using it.  tokens may go negative, which queues callers
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+class RateLimiter():
+    """
+    one adaptive token bucket per endpoint (client wide) and one per
+    (endpoint, item), created on first use
+    """
+
+    def __init__(self, endpoint_rate_per_minute=2000, item_rate_per_minute=30, endpoint_burst=100):
+        self.endpoint_rate = endpoint_rate_per_minute / 60.0
+        self.item_rate = item_rate_per_minute / 60.0
+        self.endpoint_burst = endpoint_burst
+        self.item_burst = item_rate_per_minute
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def acquire(self, endpoint, item_key=None):
+        """
+        reserves a slot on the endpoint and item buckets and returns the
+        number of seconds to wait before sending
+        """
+        return max(bucket.reserve() for bucket in self._buckets(endpoint, item_key))
+
+    def penalize(self, endpoint, item_key=None):
+        for bucket in self._buckets(endpoint, item_key):
+            bucket.penalize()
+
+    def reward(self, endpoint, item_key=None):
+        for bucket in self._buckets(endpoint, item_key):
+            bucket.reward()
+
+    def _buckets(self, endpoint, item_key):
+        keys = [(endpoint, None)] if item_key is None else [(endpoint, None), (endpoint, item_key)]
+        with self.lock:
+            for key in keys:
+                if key not in self.buckets:
+                    if key[1] is None:
+                        self.buckets[key] = TokenBucket(self.endpoint_rate, self.endpoint_burst)
+                    else:
+                        self.buckets[key] = TokenBucket(self.item_rate, self.item_burst)
+            return [self.buckets[key] for key in keys]
+
+
+class RetryPolicy():
+    """
+    decides whether a failed call is retried and after how long: jittered
+    exponential backoff ("full jitter"), never shorter than a Retry-After
+    header sent by the server
+    """
+
+    def __init__(self, max_retries=5, base_delay=0.5, max_delay=30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def retry_delay(self, e, attempt):
+        """
+        returns the seconds to sleep before retry number attempt + 1, or
+        None when the error is not retryable or retries are used up
+        """
+        if attempt >= self.max_retries or not self.is_retryable(e):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, self.retry_after(e))
+
+    @staticmethod
+    def is_retryable(e):
+        error_type, error_code = plaid_error(e)
+        if error_type is None:
+            return e.status in RETRYABLE_STATUS_CODES
+        return error_type == 'RATE_LIMIT_EXCEEDED' or error_code in RETRYABLE_ERROR_CODES
+
+    @staticmethod
+    def retry_after(e):
+        headers = e.headers or {}
+        value = headers.get('Retry-After') or headers.get('retry-after')
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return 0.0
@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class ResponseCache():
+    """
+    in-process cache of plaid responses keyed by (kind, access_token), each
+    kind with its own ttl.  callers asking for a key that is already being
+    fetched wait for that request instead of starting another one
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.in_flight = {}
+        self.generation = 0
+
+    def get_or_fetch(self, kind, access_token, fetch, ttl, cacheable=None):
+        """
+        returns the cached value for the key if it is younger than ttl
+        seconds, otherwise calls fetch() once for every concurrent caller.
+        values for which cacheable(value) is false are handed back but not
+        kept
+        """
+        key = (kind, access_token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                return entry[2]
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+                generation = self.generation
+        if not leader:
+            return future.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.in_flight[key]
+            # an invalidate() that landed while we were fetching wins
+            if generation == self.generation and (cacheable is None or cacheable(value)):
+                now = self.clock()
+                self.entries[key] = (now + ttl, now, value)
+        future.set_result(value)
+        return value
+
+    def peek(self, kind, access_token):
+        """
+        returns (value, age in seconds) for the key even if it has expired,
+        or (None, None) if nothing was ever cached
+        """
+        with self.lock:
+            entry = self.entries.get((kind, access_token))
+        if entry is None:
+            return None, None
+        return entry[2], self.clock() - entry[1]
+
+    def invalidate(self, access_token=None, kind=None):
+        """
+        drops cached values, all of them or only those matching access_token
+        and/or kind
+        """
+        with self.lock:
+            self.generation += 1
+            for key in list(self.entries):
+                if (kind is None or key[0] == kind) and (access_token is None or key[1] == access_token):
+                    del self.entries[key]
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+
+# numpy unit each period is truncated to; weeks start on monday
+PERIOD_UNITS = {'day': 'D', 'week': 'W', 'month': 'M'}
+
+# with more possible key combinations than this (or 4x the rows) the sums
+# go through np.unique instead of a dense np.bincount over every combination
+MAX_DENSE_GROUPS = 1 << 24
+
+
+def aggregate_spending(frame, by=('category',), period='month', direction='out'):
+    """
+    total amount_cents and row count of a transaction frame per period and
+    per combination of the by columns, in one pass: every key is factorized
+    to integer codes, the codes are folded into one group id and the sums
+    come out of np.bincount.  direction 'out' keeps money leaving the account
+    (plaid's positive amounts), 'in' money coming in, 'net' everything.
+    missing key values form their own group.  returns one row per non-empty
+    group, ordered by period then key
+    """
+    by = list(by)
+    cents = _cents(frame)
+    keys = [_factorize_periods(frame['date'], period)] + [_factorize(frame[column]) for column in by]
+    # filter the code arrays rather than the frame, which would copy every column
+    if direction != 'net':
+        selected = cents > 0 if direction == 'out' else cents < 0
+        cents = cents[selected]
+        keys = [(codes[selected], labels) for codes, labels in keys]
+    return _reduce(keys, ['period'] + by, cents, np.ones(len(cents), dtype=np.int64))
+
+
+def period_starts(dates, period='month'):
+    """
+    datetime64[D] start of the day, monday-based week or month each date
+    falls in
+    """
+    return _period_dates(_period_numbers(dates, period), period)
+
+
+def _period_numbers(dates, period):
+    """
+    consecutive integers per period: days, weeks or months since the epoch
+    """
+    days = np.asarray(dates, dtype='datetime64[D]')
+    if PERIOD_UNITS[period] == 'W':
+        # 1970-01-01 was a thursday, so monday weeks are offset by 3 days
+        return (days.astype(np.int64) + 3) // 7
+    return days.astype('datetime64[%s]' % PERIOD_UNITS[period]).astype(np.int64)
+
+
+def _period_dates(numbers, period):
+    numbers = np.asarray(numbers, dtype=np.int64)
+    if PERIOD_UNITS[period] == 'W':
+        return (numbers * 7 - 3).astype('datetime64[D]')
+    return numbers.astype('datetime64[%s]' % PERIOD_UNITS[period]).astype('datetime64[D]')
+
+
+class SpendingRollup():
+    """
+    aggregate_spending with partial results cached per calendar month.
+    rollup() fingerprints each month's rows (an order independent sum of
+    row hashes) and only re-aggregates the months whose rows changed since
+    the last call, then merges the monthly partials.  weeks that straddle
+    two months are split across both partials and summed back together
+    """
+
+    def __init__(self, by=('category',), period='month', direction='out'):
+        self.by = list(by)
+        self.period = period
+        self.direction = direction
+        self.partials = {}
+        self.recomputed = []
+
+    def rollup(self, frame):
+        # only what feeds the aggregate, so the fingerprints hash nothing else
+        columns = [column for column in ['date', 'amount_cents', 'amount'] + self.by if column in frame.columns]
+        frame = frame[columns]
+        if self.direction != 'net':
+            cents = _cents(frame)
+            frame = frame[cents > 0 if self.direction == 'out' else cents < 0]
+        months = np.asarray(frame['date'], dtype='datetime64[M]')
+        order = np.argsort(months, kind='stable')
+        months = months[order]
+        frame = frame.iloc[order]
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]]) if len(months) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(months)]
+        fingerprints = self.fingerprints(frame, starts)
+
+        self.recomputed = []
+        partials = []
+        for start, end, fingerprint in zip(starts, ends, fingerprints):
+            month = months[start]
+            cached = self.partials.get(month)
+            if cached is None or cached[0] != fingerprint:
+                cached = (fingerprint, aggregate_spending(frame.iloc[start:end], self.by, self.period, 'net'))
+                self.partials[month] = cached
+                self.recomputed.append(month)
+            partials.append(cached[1])
+
+        if not partials:
+            return aggregate_spending(frame, self.by, self.period, 'net')
+        combined = pd.concat(partials, ignore_index=True)
+        keys = [_factorize(combined[column]) for column in ['period'] + self.by]
+        return _reduce(keys, ['period'] + self.by, combined['amount_cents'].to_numpy(),
+                       combined['count'].to_numpy())
+
+    def fingerprints(self, frame, starts):
+        """
+        one uint64 per month run of frame, summed from per-row hashes of
+        everything that feeds the aggregate
+        """
+        if not len(starts):
+            return []
+        hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        # numpy additions wrap modulo 2**64, which is what we want here
+        return np.add.reduceat(hashes, starts).tolist()
+
+    def invalidate(self, month=None):
+        """
+        drops the cached partial of one month ('2024-03' or anything
+        datetime64 accepts), or all of them
+        """
+        if month is None:
+            self.partials = {}
+        else:
+            self.partials.pop(np.datetime64(month, 'M'), None)
+
+
+def _cents(frame):
+    if 'amount_cents' in frame.columns:
+        return frame['amount_cents'].to_numpy(dtype=np.int64)
+    return np.rint(frame['amount'].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+
+
+def _factorize(series):
+    """
+    (codes, labels) with code 0 reserved for missing values.  categoricals
+    reuse their codes, anything else goes through a sorted pd.factorize
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, labels = series.cat.codes.to_numpy(), series.cat.categories
+    else:
+        codes, labels = pd.factorize(series, sort=True)
+    return codes.astype(np.int64) + 1, labels
+
+
+def _factorize_periods(dates, period):
+    """
+    _factorize for the period of each date without sorting: the codes are
+    period numbers shifted to start at 1, the labels every period from the
+    first to the last (empty ones never make it out of _reduce)
+    """
+    numbers = _period_numbers(dates, period)
+    valid = numbers != np.iinfo(np.int64).min
+    if not valid.any():
+        return np.zeros(len(numbers), dtype=np.int64), pd.DatetimeIndex([], dtype='datetime64[s]')
+    first, last = numbers[valid].min(), numbers[valid].max()
+    codes = np.where(valid, numbers - first + 1, 0)
+    return codes, pd.DatetimeIndex(_period_dates(np.arange(first, last + 1), period))
+
+
+def _reduce(keys, names, cents, counts):
+    """
+    sums cents and counts per distinct combination of the factorized keys.
+    group ids are the codes in mixed radix, first key most significant, so
+    the groups come out ordered by the first key, then the second...
+    """
+    sizes = [len(labels) + 1 for _, labels in keys]
+    group = np.zeros(len(cents), dtype=np.int64)
+    for (codes, _), size in zip(keys, sizes):
+        group = group * size + codes
+
+    total = int(np.prod(sizes, dtype=np.float64))
+    if total <= max(MAX_DENSE_GROUPS, 4 * len(group)) and total < 2 ** 62:
+        amounts = np.bincount(group, weights=cents, minlength=total)
+        rows = np.bincount(group, weights=counts, minlength=total)
+        groups = np.flatnonzero(rows)
+        amounts, rows = amounts[groups], rows[groups]
+    else:
+        groups, inverse = np.unique(group, return_inverse=True)
+        amounts = np.bincount(inverse, weights=cents)
+        rows = np.bincount(inverse, weights=counts)
+
+    columns = {}
+    for name, (_, labels), codes in zip(names, keys, np.unravel_index(groups, sizes)):
+        if name == 'period':
+            columns[name] = labels.take(codes - 1, allow_fill=True, fill_value=pd.NaT)
+        else:
+            columns[name] = pd.Categorical.from_codes(codes - 1, categories=labels)
+    result = pd.DataFrame(columns)
+    result['amount_cents'] = np.rint(amounts).astype(np.int64)
+    result['count'] = rows.astype(np.int64)
+    return result
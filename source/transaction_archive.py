@@ -0,0 +1,153 @@
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+
+PARTITION_FIELDS = [pa.field('account_id', pa.string()), pa.field('year_month', pa.string())]
+
+
+def prepare_archive_frame(frame):
+    """
+    reshapes a get_account_history frame into stable parquet types: dates
+    become timestamps, plaid's category list is split into the top level
+    category and the full path, and other list/dict cells become json text
+    """
+    frame = frame.copy()
+    frame['date'] = pd.to_datetime(frame['date']).astype('datetime64[ms]')
+    frame['year_month'] = frame['date'].dt.strftime('%Y-%m')
+    if 'category' in frame.columns and frame['category'].map(lambda value: isinstance(value, list)).any():
+        categories = frame['category']
+        frame['category'] = categories.map(lambda value: value[0] if isinstance(value, list) and value else None)
+        frame['category_path'] = categories.map(
+            lambda value: ' > '.join(value) if isinstance(value, list) else None)
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype('string')
+            continue
+        if frame[column].dtype != object:
+            continue
+        if frame[column].map(lambda value: isinstance(value, (list, dict))).any():
+            frame[column] = frame[column].map(
+                lambda value: None if value is None else json.dumps(value, default=str))
+        elif frame[column].map(lambda value: isinstance(value, bool)).all():
+            frame[column] = frame[column].astype('boolean')
+        else:
+            frame[column] = frame[column].map(lambda value: None if value is None else str(value)).astype('string')
+    frame['archived_at'] = pd.Series(pd.Timestamp(datetime.now()), index=frame.index).astype('datetime64[ms]')
+    return frame
+
+
+class TransactionArchive():
+    """
+    append-only parquet dataset of transaction frames, hive partitioned by
+    account_id and year_month.  reads prune partitions by account and month
+    and push the date and category predicates down to the row groups
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def append(self, frame):
+        """
+        writes frame as new files under each account_id/year_month it
+        touches and returns the number of rows written
+        """
+        if frame.empty:
+            return 0
+        table = pa.Table.from_pandas(prepare_archive_frame(frame), preserve_index=False)
+        ds.write_dataset(
+            table, self.root, format='parquet',
+            partitioning=ds.partitioning(pa.schema(PARTITION_FIELDS), flavor='hive'),
+            basename_template='%s-%s-{i}.parquet' % (datetime.now().strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex),
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        return table.num_rows
+
+    def load(self, account_ids=None, start=None, end=None, categories=None, columns=None):
+        """
+        reads the archive back as a DataFrame, optionally limited to some
+        accounts, a start..end date range (inclusive) and top level
+        categories.  a transaction archived more than once comes back once,
+        as its latest copy, and a pending transaction that has since posted
+        (under a new id naming it as pending_transaction_id) not at all
+        """
+        if not os.path.isdir(self.root):
+            return pd.DataFrame()
+
+        partition_filter = None
+        row_filter = None
+        if account_ids is not None:
+            partition_filter = ds.field('account_id').isin(list(account_ids))
+        if start is not None:
+            start = pd.Timestamp(start)
+            partition_filter = self._and(partition_filter, ds.field('year_month') >= start.strftime('%Y-%m'))
+            row_filter = self._and(row_filter, ds.field('date') >= start)
+        if end is not None:
+            end = pd.Timestamp(end)
+            partition_filter = self._and(partition_filter, ds.field('year_month') <= end.strftime('%Y-%m'))
+            row_filter = self._and(row_filter, ds.field('date') <= end)
+        if categories is not None:
+            row_filter = self._and(row_filter, ds.field('category').isin(list(categories)))
+
+        partitioning = ds.partitioning(pa.schema(PARTITION_FIELDS), flavor='hive')
+        fragments = list(ds.dataset(self.root, format='parquet', partitioning=partitioning)
+                         .get_fragments(filter=partition_filter))
+        if not fragments:
+            return pd.DataFrame()
+
+        # appends from different plaid payloads can carry different columns,
+        # so read the surviving files against the union of their schemas
+        schema = pa.unify_schemas([fragment.physical_schema for fragment in fragments] +
+                                  [pa.schema(PARTITION_FIELDS)], promote_options='permissive')
+        dataset = ds.dataset([fragment.path for fragment in fragments], schema=schema, format='parquet',
+                             partitioning=partitioning, partition_base_dir=self.root)
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + ['transaction_id', 'date', 'archived_at']))
+        frame = dataset.to_table(columns=columns, filter=self._and(partition_filter, row_filter)).to_pandas()
+
+        if 'transaction_id' in frame.columns:
+            frame = (frame.sort_values('archived_at', kind='stable')
+                     .drop_duplicates('transaction_id', keep='last')
+                     .sort_values('date', ascending=False, kind='stable')
+                     .reset_index(drop=True))
+            pending = frame['transaction_id']
+            if 'pending' in frame.columns:
+                pending = pending[frame['pending'].fillna(False).astype(bool)]
+            if len(pending):
+                frame = frame[~frame['transaction_id'].isin(self._posted(pending, account_ids, start))]
+                frame = frame.reset_index(drop=True)
+        return frame
+
+    def _posted(self, pending_ids, account_ids, start):
+        """
+        those of pending_ids that an archived row names as its
+        pending_transaction_id.  the posted copy is dated on or after the
+        pending one, so only months from start on are read, but it may lie
+        past end
+        """
+        partition_filter = None
+        if account_ids is not None:
+            partition_filter = ds.field('account_id').isin(list(account_ids))
+        if start is not None:
+            partition_filter = self._and(partition_filter, ds.field('year_month') >= start.strftime('%Y-%m'))
+        partitioning = ds.partitioning(pa.schema(PARTITION_FIELDS), flavor='hive')
+        paths = [fragment.path for fragment in ds.dataset(self.root, format='parquet', partitioning=partitioning)
+                 .get_fragments(filter=partition_filter)
+                 if 'pending_transaction_id' in fragment.physical_schema.names]
+        if not paths:
+            return set()
+        dataset = ds.dataset(paths, schema=pa.schema([pa.field('pending_transaction_id', pa.string())]),
+                             format='parquet')
+        table = dataset.to_table(filter=ds.field('pending_transaction_id').isin(list(pending_ids)))
+        return set(table.column('pending_transaction_id').to_pylist())
+
+    @staticmethod
+    def _and(left, right):
+        if left is None or right is None:
+            return right if left is None else left
+        return left & right
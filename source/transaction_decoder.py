@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+
+# (column, path into the transaction, kind).  the same paths serve plaid
+# model objects and raw json dicts, see _fields
+TRANSACTION_COLUMNS = [
+    ('transaction_id', ('transaction_id',), 'object'),
+    ('account_id', ('account_id',), 'category'),
+    ('date', ('date',), 'date'),
+    ('authorized_date', ('authorized_date',), 'date'),
+    ('amount_cents', ('amount',), 'cents'),
+    ('iso_currency_code', ('iso_currency_code',), 'category'),
+    ('unofficial_currency_code', ('unofficial_currency_code',), 'category'),
+    ('name', ('name',), 'object'),
+    ('merchant_name', ('merchant_name',), 'category'),
+    ('category', ('category',), 'category_list'),
+    ('category_id', ('category_id',), 'category'),
+    ('pending', ('pending',), 'bool'),
+    ('pending_transaction_id', ('pending_transaction_id',), 'object'),
+    ('account_owner', ('account_owner',), 'object'),
+    ('payment_channel', ('payment_channel',), 'category'),
+    ('transaction_type', ('transaction_type',), 'category'),
+    ('personal_finance_category.primary', ('personal_finance_category', 'primary'), 'category'),
+    ('personal_finance_category.detailed', ('personal_finance_category', 'detailed'), 'category'),
+    ('location.address', ('location', 'address'), 'object'),
+    ('location.city', ('location', 'city'), 'object'),
+    ('location.region', ('location', 'region'), 'object'),
+    ('location.postal_code', ('location', 'postal_code'), 'object'),
+    ('location.country', ('location', 'country'), 'object'),
+    ('location.lat', ('location', 'lat'), 'float'),
+    ('location.lon', ('location', 'lon'), 'float'),
+    ('location.store_number', ('location', 'store_number'), 'object'),
+    ('payment_meta.reference_number', ('payment_meta', 'reference_number'), 'object'),
+    ('payment_meta.ppd_id', ('payment_meta', 'ppd_id'), 'object'),
+    ('payment_meta.payee', ('payment_meta', 'payee'), 'object'),
+    ('payment_meta.by_order_of', ('payment_meta', 'by_order_of'), 'object'),
+    ('payment_meta.payer', ('payment_meta', 'payer'), 'object'),
+    ('payment_meta.payment_method', ('payment_meta', 'payment_method'), 'object'),
+    ('payment_meta.payment_processor', ('payment_meta', 'payment_processor'), 'object'),
+    ('payment_meta.reason', ('payment_meta', 'reason'), 'object'),
+]
+
+
+def decode_transactions(transactions):
+    """
+    builds the transaction DataFrame straight from a list of plaid
+    Transaction models or raw json dicts.  each column is filled into a
+    fixed dtype array in one pass: datetime64 dates, int64 cents for the
+    amount and categoricals for the repeated strings.  plaid's category list
+    becomes its top level category plus the full ' > ' joined path
+    """
+    count = len(transactions)
+    transactions = [_fields(transaction) for transaction in transactions]
+    columns = {}
+    for column, path, kind in TRANSACTION_COLUMNS:
+        values = _values(transactions, path)
+        if kind == 'object':
+            columns[column] = np.fromiter(values, dtype=object, count=count)
+        elif kind == 'category':
+            columns[column] = encode_categories(values, count)
+        elif kind == 'date':
+            columns[column] = np.array(list(values), dtype='datetime64[D]')
+        elif kind == 'cents':
+            amounts = np.fromiter((np.nan if value is None else value for value in values),
+                                  dtype=np.float64, count=count)
+            columns[column] = np.rint(amounts * 100).astype(np.int64)
+        elif kind == 'float':
+            columns[column] = np.fromiter((np.nan if value is None else value for value in values),
+                                          dtype=np.float64, count=count)
+        elif kind == 'bool':
+            columns[column] = np.fromiter((bool(value) for value in values), dtype=bool, count=count)
+        elif kind == 'category_list':
+            paths = np.fromiter(values, dtype=object, count=count)
+            columns[column] = encode_categories((value[0] if value else None for value in paths), count)
+            columns[column + '_path'] = encode_categories(
+                (' > '.join(value) if value else None for value in paths), count)
+    return pd.DataFrame(columns, copy=False)
+
+
+def encode_categories(values, count):
+    """
+    factorizes an iterable of hashable values into a Categorical, giving
+    each distinct value a code the first time it is seen.  None maps to NaN
+    """
+    index = {}
+    codes = np.fromiter((-1 if value is None else index.setdefault(value, len(index)) for value in values),
+                        dtype=np.int32, count=count)
+    return pd.Categorical.from_codes(codes, categories=list(index))
+
+
+def _values(transactions, path):
+    if len(path) == 1:
+        name = path[0]
+        return (transaction.get(name) for transaction in transactions)
+    parent, name = path
+    return (_child(transaction.get(parent), name) for transaction in transactions)
+
+
+def _child(value, name):
+    return None if value is None else _fields(value).get(name)
+
+
+def _fields(value):
+    # plaid models keep their set fields in a plain dict.  reading it directly
+    # skips ModelComposed.get, which compares every nested model it returns
+    # across the composed instances and costs more than to_dict
+    return getattr(value, '_data_store', value)
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+
+# columns that are unique or nearly unique per row; a categorical would
+# only add a code array on top of the strings
+UNIQUE_STRING_COLUMNS = ['transaction_id', 'pending_transaction_id', 'payment_meta.reference_number']
+FLOAT32_COLUMNS = ['location.lat', 'location.lon']
+BOOLEAN_COLUMNS = ['pending']
+
+
+def compact_frame(frame, max_category_ratio=0.5):
+    """
+    casts a transaction frame to compact dtypes: the float amount becomes
+    int64 amount_cents, pending a nullable boolean, lat/lon float32, unique
+    ids arrow backed strings, and every other text column (ids, categories,
+    currency codes, the nested location.* and payment_meta.* fields) a
+    categorical when fewer than max_category_ratio of its values are distinct
+    """
+    frame = frame.copy(deep=False)
+    if 'amount' in frame.columns and 'amount_cents' not in frame.columns:
+        frame.insert(frame.columns.get_loc('amount'), 'amount_cents',
+                     np.rint(frame['amount'].to_numpy(dtype=np.float64) * 100).astype(np.int64))
+        frame = frame.drop(columns='amount')
+
+    for column in frame.columns:
+        series = frame[column]
+        if column in BOOLEAN_COLUMNS:
+            frame[column] = series.astype('boolean')
+        elif column in FLOAT32_COLUMNS:
+            frame[column] = pd.to_numeric(series, errors='coerce').astype(np.float32)
+        elif column in UNIQUE_STRING_COLUMNS:
+            frame[column] = _as_string(series)
+        elif _is_text(series):
+            if series.map(lambda value: isinstance(value, (list, dict))).any():
+                continue
+            if series.nunique(dropna=True) <= max_category_ratio * max(len(series), 1):
+                frame[column] = series.astype('category')
+            else:
+                frame[column] = _as_string(series)
+    return frame
+
+
+def _is_text(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def _as_string(series):
+    try:
+        return series.astype('string[pyarrow]')
+    except ImportError:
+        return series.astype('string')
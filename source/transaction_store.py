@@ -0,0 +1,370 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+
+def summary_keys(row):
+    """
+    sql expressions for the monthly_summaries key and amount of a
+    transactions row (NEW or OLD inside a trigger).  NULLs become '' so they
+    still take part in the primary key
+    """
+    return {
+        'account': "coalesce(%s.account_id, '')" % row,
+        'category': "coalesce(json_extract(%s.payload, '$.category[0]'), '')" % row,
+        'month': "substr(%s.date, 1, 7)" % row,
+        'currency': "coalesce(json_extract({0}.payload, '$.iso_currency_code'), "
+                    "json_extract({0}.payload, '$.unofficial_currency_code'), '')".format(row),
+        'cents': "CAST(round(coalesce(json_extract(%s.payload, '$.amount'), 0) * 100) AS INTEGER)" % row,
+    }
+
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id TEXT PRIMARY KEY,
+    item_key TEXT NOT NULL,
+    account_id TEXT,
+    date TEXT,
+    payload TEXT NOT NULL
+);
+-- transaction_id lookups use the primary key index
+CREATE INDEX IF NOT EXISTS transactions_account_date ON transactions (account_id, date);
+CREATE INDEX IF NOT EXISTS transactions_item_date ON transactions (item_key, date);
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT PRIMARY KEY,
+    item_key TEXT NOT NULL,
+    name TEXT,
+    type TEXT,
+    subtype TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS balance_snapshots (
+    account_id TEXT NOT NULL,
+    captured_at TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    current REAL,
+    available REAL,
+    credit_limit REAL,
+    iso_currency_code TEXT,
+    PRIMARY KEY (account_id, captured_at)
+);
+CREATE INDEX IF NOT EXISTS balance_snapshots_item ON balance_snapshots (item_key, captured_at);
+CREATE TABLE IF NOT EXISTS fetched_windows (
+    item_key TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    PRIMARY KEY (item_key, start_date, end_date)
+);
+CREATE TABLE IF NOT EXISTS sync_cursors (
+    item_key TEXT PRIMARY KEY,
+    cursor TEXT NOT NULL
+);
+-- raw plaid name -> canonical merchant, per version of the cleaning pipeline
+CREATE TABLE IF NOT EXISTS merchant_names (
+    raw TEXT NOT NULL,
+    pipeline TEXT NOT NULL,
+    canonical TEXT,
+    PRIMARY KEY (raw, pipeline)
+);
+-- spend per account, top level category, month and currency, kept current
+-- by the triggers below on every insert, update and delete of transactions
+CREATE TABLE IF NOT EXISTS monthly_summaries (
+    item_key TEXT NOT NULL,
+    account_id TEXT NOT NULL,
+    category TEXT NOT NULL,
+    month TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    outflow_cents INTEGER NOT NULL,
+    inflow_cents INTEGER NOT NULL,
+    transaction_count INTEGER NOT NULL,
+    PRIMARY KEY (account_id, category, month, currency)
+);
+CREATE INDEX IF NOT EXISTS monthly_summaries_item_month ON monthly_summaries (item_key, month);
+CREATE TRIGGER IF NOT EXISTS transactions_summary_insert AFTER INSERT ON transactions BEGIN
+    {add_new};
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_summary_delete AFTER DELETE ON transactions BEGIN
+    {remove_old};
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_summary_update AFTER UPDATE ON transactions BEGIN
+    {remove_old};
+    {add_new};
+END;
+""".format(
+    add_new="""
+    INSERT INTO monthly_summaries
+        (item_key, account_id, category, month, currency, outflow_cents, inflow_cents, transaction_count)
+    VALUES (NEW.item_key, {account}, {category}, {month}, {currency}, max({cents}, 0), min({cents}, 0), 1)
+    ON CONFLICT (account_id, category, month, currency) DO UPDATE SET
+        item_key = excluded.item_key,
+        outflow_cents = outflow_cents + excluded.outflow_cents,
+        inflow_cents = inflow_cents + excluded.inflow_cents,
+        transaction_count = transaction_count + 1""".format(**summary_keys('NEW')),
+    remove_old="""
+    UPDATE monthly_summaries SET
+        outflow_cents = outflow_cents - max({cents}, 0),
+        inflow_cents = inflow_cents - min({cents}, 0),
+        transaction_count = transaction_count - 1
+    WHERE account_id = {account} AND category = {category} AND month = {month} AND currency = {currency};
+    DELETE FROM monthly_summaries
+    WHERE account_id = {account} AND category = {category} AND month = {month} AND currency = {currency}
+        AND transaction_count <= 0""".format(**summary_keys('OLD')),
+)
+
+# bumped whenever a migration below has to run against an existing file
+SCHEMA_VERSION = 1
+
+
+def token_key(access_token):
+    """
+    stable key for an access token so raw tokens are never written to disk
+    """
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+
+class TransactionStore():
+    """
+    local sqlite copy of the transactions pulled from plaid, keyed by
+    transaction_id and scoped to the item (access token) they came from
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def close(self):
+        self.connection.close()
+
+    def get_cursor(self, access_token):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT cursor FROM sync_cursors WHERE item_key = ?', (token_key(access_token),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def apply_sync(self, access_token, added, modified, removed, next_cursor):
+        """
+        applies one /transactions/sync delta and its cursor atomically, so a
+        crash part way through never leaves the cursor ahead of the data
+        """
+        item_key = token_key(access_token)
+        with self.lock, self.connection:
+            self._upsert(item_key, list(added) + list(modified))
+            self.connection.executemany(
+                'DELETE FROM transactions WHERE transaction_id = ?',
+                [(transaction_id,) for transaction_id in removed]
+            )
+            self.connection.execute(
+                'INSERT INTO sync_cursors (item_key, cursor) VALUES (?, ?) '
+                'ON CONFLICT(item_key) DO UPDATE SET cursor = excluded.cursor',
+                (item_key, next_cursor)
+            )
+
+    def replace_window(self, access_token, start, end, transactions, complete=True):
+        """
+        stores the result of fetching start..end (inclusive).  rows already
+        stored for the window are dropped first so pending transactions that
+        have since posted under a new id do not linger.  complete windows are
+        remembered and skipped by missing_windows from then on
+        """
+        item_key = token_key(access_token)
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM transactions WHERE item_key = ? AND date >= ? AND date <= ?',
+                (item_key, str(start), str(end))
+            )
+            self._upsert(item_key, transactions)
+            if complete:
+                self.connection.execute(
+                    'INSERT OR IGNORE INTO fetched_windows (item_key, start_date, end_date) VALUES (?, ?, ?)',
+                    (item_key, str(start), str(end))
+                )
+
+    def missing_windows(self, access_token, windows):
+        """
+        returns the (start, end) windows that are not covered by windows
+        already stored for this item
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT start_date, end_date FROM fetched_windows WHERE item_key = ?', (token_key(access_token),)
+            ).fetchall()
+        covered = set()
+        for start, end in rows:
+            day = datetime.strptime(start, '%Y-%m-%d').date()
+            last = datetime.strptime(end, '%Y-%m-%d').date()
+            while day <= last:
+                covered.add(day)
+                day += timedelta(days=1)
+
+        missing = []
+        for start, end in windows:
+            day = start
+            while day <= end and day in covered:
+                day += timedelta(days=1)
+            if day <= end:
+                missing.append((start, end))
+        return missing
+
+    def upsert_accounts(self, access_token, accounts):
+        item_key = token_key(access_token)
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO accounts (account_id, item_key, name, type, subtype, payload) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(account_id) DO UPDATE SET item_key = excluded.item_key, name = excluded.name, '
+                'type = excluded.type, subtype = excluded.subtype, payload = excluded.payload',
+                [(account['account_id'], item_key, account.get('name'), account.get('type'),
+                  account.get('subtype'), json.dumps(account, default=str)) for account in accounts]
+            )
+
+    def record_balances(self, access_token, accounts, captured_at=None):
+        """
+        appends one balance snapshot per account from a /accounts/balance/get
+        (or /accounts/get) response
+        """
+        item_key = token_key(access_token)
+        captured_at = (captured_at or datetime.now()).isoformat(timespec='seconds')
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO balance_snapshots '
+                '(account_id, captured_at, item_key, current, available, credit_limit, iso_currency_code) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(account['account_id'], captured_at, item_key, account['balances'].get('current'),
+                  account['balances'].get('available'), account['balances'].get('limit'),
+                  account['balances'].get('iso_currency_code')) for account in accounts]
+            )
+
+    def get_balance_snapshots(self, access_token, start=None, end=None):
+        """
+        returns the recorded balance snapshots of an item as dicts, oldest
+        first, with the account type from the accounts table, optionally
+        limited to start <= captured_at <= end (dates cover the whole day)
+        """
+        query = ('SELECT s.account_id, s.captured_at, s.current, s.available, s.credit_limit, '
+                 's.iso_currency_code, a.type FROM balance_snapshots s '
+                 'LEFT JOIN accounts a ON a.account_id = s.account_id WHERE s.item_key = ?')
+        params = [token_key(access_token)]
+        if start is not None:
+            query += ' AND s.captured_at >= ?'
+            params.append(str(start))
+        if end is not None:
+            query += ' AND substr(s.captured_at, 1, 10) <= ?'
+            params.append(str(end)[:10])
+        query += ' ORDER BY s.captured_at, s.account_id'
+        with self.lock:
+            cursor = self.connection.execute(query, params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def get_merchant_names(self, raws, pipeline):
+        """
+        returns {raw: canonical} for the raw names already cleaned by this
+        pipeline version
+        """
+        raws = list(raws)
+        found = {}
+        with self.lock:
+            # stays under sqlite's limit on bound parameters
+            for offset in range(0, len(raws), 500):
+                chunk = raws[offset:offset + 500]
+                found.update(self.connection.execute(
+                    'SELECT raw, canonical FROM merchant_names WHERE pipeline = ? AND raw IN (%s)'
+                    % ', '.join('?' * len(chunk)), [pipeline] + chunk
+                ).fetchall())
+        return found
+
+    def put_merchant_names(self, names, pipeline):
+        """
+        stores {raw: canonical} for a pipeline version
+        """
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO merchant_names (raw, pipeline, canonical) VALUES (?, ?, ?)',
+                [(raw, pipeline, canonical) for raw, canonical in names.items()]
+            )
+
+    def get_monthly_summaries(self, access_token, start=None, end=None, account_ids=None):
+        """
+        returns the materialized monthly_summaries rows of an item as dicts,
+        optionally limited to months start <= month <= end (anything whose
+        str() starts with YYYY-MM) and to some accounts.  outflow_cents is
+        money leaving the account, inflow_cents (<= 0) money coming in, as
+        plaid signs amounts.  category and currency are '' when plaid gave none
+        """
+        query = ('SELECT account_id, category, month, currency, outflow_cents, inflow_cents, transaction_count '
+                 'FROM monthly_summaries WHERE item_key = ?')
+        params = [token_key(access_token)]
+        if start is not None:
+            query += ' AND month >= ?'
+            params.append(str(start)[:7])
+        if end is not None:
+            query += ' AND month <= ?'
+            params.append(str(end)[:7])
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            query += ' AND account_id IN (%s)' % ', '.join('?' * len(account_ids))
+            params.extend(account_ids)
+        query += ' ORDER BY month, account_id, category, currency'
+        with self.lock:
+            cursor = self.connection.execute(query, params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def rebuild_monthly_summaries(self):
+        """
+        recomputes monthly_summaries from scratch.  the triggers keep it
+        current, this is for files written before it existed
+        """
+        keys = summary_keys('transactions')
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM monthly_summaries')
+            self.connection.execute(
+                'INSERT INTO monthly_summaries '
+                '(item_key, account_id, category, month, currency, outflow_cents, inflow_cents, transaction_count) '
+                'SELECT max(item_key), {account}, {category}, {month}, {currency}, '
+                'sum(max({cents}, 0)), sum(min({cents}, 0)), count(*) FROM transactions '
+                'GROUP BY {account}, {category}, {month}, {currency}'.format(**keys)
+            )
+
+    def _migrate(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            self.rebuild_monthly_summaries()
+        if version < SCHEMA_VERSION:
+            with self.lock:
+                self.connection.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+
+    def get_transactions(self, access_token, start=None, end=None):
+        """
+        returns the stored transactions for an item as plaid shaped dicts,
+        newest first, optionally limited to start <= date <= end
+        """
+        query = 'SELECT payload FROM transactions WHERE item_key = ?'
+        params = [token_key(access_token)]
+        if start is not None:
+            query += ' AND date >= ?'
+            params.append(str(start))
+        if end is not None:
+            query += ' AND date <= ?'
+            params.append(str(end))
+        query += ' ORDER BY date DESC, transaction_id'
+        with self.lock:
+            rows = self.connection.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _upsert(self, item_key, transactions):
+        self.connection.executemany(
+            'INSERT INTO transactions (transaction_id, item_key, account_id, date, payload) '
+            'VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(transaction_id) DO UPDATE SET item_key = excluded.item_key, '
+            'account_id = excluded.account_id, date = excluded.date, payload = excluded.payload',
+            [(transaction['transaction_id'], item_key, transaction['account_id'], str(transaction['date']),
+              json.dumps(transaction, default=str)) for transaction in transactions]
+        )
@@ -1,26 +1,100 @@
+# plaid, pandas, numpy, dateutil and pyarrow are imported inside the
+# functions that use them: importing this module stays cheap for cli runs and
+# cron jobs, and balance lookups never load pandas at all
+# (benchmarks/import_time.py checks both)
 import os
-import plaid
-from plaid.api import plaid_api
-from plaid.model.products import Products
-from plaid.model.transactions_get_request import TransactionsGetRequest
-from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
-from plaid.model.accounts_get_request import AccountsGetRequest
-from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import pandas as pd
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import json
+import copy
+import threading
+import time
+import logging
+from transaction_store import TransactionStore, token_key
+from response_cache import ResponseCache
+from rate_limiting import RateLimiter, RetryPolicy, is_rate_limited
+from circuit_breaker import CircuitBreakers, CircuitOpenError, is_api_exception, is_endpoint_failure
+from instrumentation import Instrumentation, response_rows
+
+logger = logging.getLogger(__name__)
+
+PLAID_MAX_PAGE_SIZE = 500
+
+# shared by every plaid_interface in the process so short-lived instances
+# (one per request handler) still hit the same cache
+RESPONSE_CACHE = ResponseCache()
+
+# plaid's limits apply per client and per item across every worker thread,
+# so the buckets are process wide as well
+RATE_LIMITER = RateLimiter(
+    endpoint_rate_per_minute=int(os.getenv('PLAID_ENDPOINT_RATE_PER_MINUTE', 2000)),
+    item_rate_per_minute=int(os.getenv('PLAID_ITEM_RATE_PER_MINUTE', 30))
+)
+
+CIRCUIT_BREAKERS = CircuitBreakers(
+    failure_threshold=int(os.getenv('PLAID_BREAKER_THRESHOLD', 5)),
+    reset_timeout=float(os.getenv('PLAID_BREAKER_RESET', 30))
+)
+
+# disabled until an exporter is added, e.g.
+# INSTRUMENTATION.add_exporter(instrumentation.PrometheusExporter())
+INSTRUMENTATION = Instrumentation()
+
+ITEM_TAG_COLUMNS = ['item_key', 'account_name', 'account_type']
+
+# anchor -> (pandas.offsets class, arguments)
+DATE_ANCHORS = {
+    'month_start': ('MonthBegin', {}),
+    'month_end': ('MonthEnd', {}),
+    'week': ('Week', {'weekday': 0}),
+}
+
+
+def shift_months(dates, months):
+    """
+    vectorized relativedelta(months=...): moves datetime64 dates by a
+    number (or array) of months, clamping the day to the target month's
+    length the way relativedelta does
+    """
+    import numpy as np
+
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    month_starts = dates.astype('datetime64[M]')
+    day = dates - month_starts.astype('datetime64[D]')
+    target = month_starts + np.asarray(months)
+    month_length = (target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')
+    return target.astype('datetime64[D]') + np.minimum(day, month_length - 1)
+
+
+def plaid_host(plaid_env):
+    """
+    base url of a PLAID_ENV, or PLAID_HOST when set (to point the clients
+    somewhere else, e.g. benchmarks/mock_plaid_server.py).  shared by
+    plaid_interface and AsyncPlaidInterface
+    """
+    import plaid
+
+    if os.getenv('PLAID_HOST'):
+        return os.getenv('PLAID_HOST')
+    config_environment = {
+        'sandbox': plaid.Environment.Sandbox,
+        # plaid-python dropped the development environment in v13
+        'development': getattr(plaid.Environment, 'Development', None),
+        'production': plaid.Environment.Production
+    }
+    host = config_environment.get(plaid_env)
+    if host is None:
+        raise ValueError('PLAID_ENV %r is not available in this plaid-python; use sandbox or production, '
+                         'or set PLAID_HOST' % (plaid_env,))
+    return host
 
 
 class plaid_interface():
 
     def __init__(self):
-        config_environment = {
-            'sandbox': plaid.Environment.Sandbox,
-            'development': plaid.Environment.Development,
-            'production': plaid.Environment.Production
+        from plaid.model.products import Products
+        from client_registry import get_plaid_client
 
-        }
         self.PLAID_CLIENT_ID = os.getenv('PLAID_CLIENT_ID')
         self.PLAID_SECRET = os.getenv('PLAID_SECRET')
         self.PLAID_ENV = os.getenv('PLAID_ENV')
@@ -28,35 +102,135 @@ class plaid_interface():
         self.PLAID_COUNTRY_CODES = os.getenv('PLAID_COUNTRY_CODES').split(',')
         self.PLAID_REDIRECT_URI = os.getenv('PLAID_REDIRECT_URI', None)
         self.ACCESS_TOKEN = os.getenv('PLAID_ACCESS_TOKEN')
-        self.host = config_environment[self.PLAID_ENV]
-
-        self.configuration = plaid.Configuration(
-            host=self.host,
-            api_key={
-                'clientId': self.PLAID_CLIENT_ID,
-                'secret': self.PLAID_SECRET,
-                'plaidVersion': '2020-09-14'
-            }
-        )
+        self.PLAID_PAGE_SIZE = int(os.getenv('PLAID_PAGE_SIZE', PLAID_MAX_PAGE_SIZE))
+        self.PLAID_MAX_IN_FLIGHT = int(os.getenv('PLAID_MAX_IN_FLIGHT', 4))
+        self.PLAID_MAX_ITEMS_IN_FLIGHT = int(os.getenv('PLAID_MAX_ITEMS_IN_FLIGHT', 8))
+        self.PLAID_REFETCH_DAYS = int(os.getenv('PLAID_REFETCH_DAYS', 14))
+        self.PLAID_ACCOUNTS_TTL = float(os.getenv('PLAID_ACCOUNTS_TTL', 3600))
+        self.PLAID_BALANCE_TTL = float(os.getenv('PLAID_BALANCE_TTL', 60))
+        self.PLAID_POOL_SIZE = int(os.getenv('PLAID_POOL_SIZE', 32))
+        self.PLAID_KEEPALIVE_IDLE = int(os.getenv('PLAID_KEEPALIVE_IDLE', 60))
+        self.PLAID_CONNECT_TIMEOUT = float(os.getenv('PLAID_CONNECT_TIMEOUT', 5))
+        self.PLAID_READ_TIMEOUT = float(os.getenv('PLAID_READ_TIMEOUT', 60))
+        self.PLAID_MAX_RETRIES = int(os.getenv('PLAID_MAX_RETRIES', 5))
+        self.STORE_PATH = os.getenv('WEALTHBUILDER_DB', 'wealthbuilder.db')
+        self.ARCHIVE_PATH = os.getenv('WEALTHBUILDER_ARCHIVE', 'wealthbuilder_archive')
+        self.host = plaid_host(self.PLAID_ENV)
 
-        self.api_client = plaid.ApiClient(self.configuration)
-        self.client = plaid_api.PlaidApi(self.api_client)
+        self.api_client, self.client = get_plaid_client(
+            self.host, self.PLAID_CLIENT_ID, self.PLAID_SECRET,
+            pool_size=self.PLAID_POOL_SIZE, keepalive_idle=self.PLAID_KEEPALIVE_IDLE
+        )
+        self.configuration = self.api_client.configuration
 
         self.products = []
         for product in self.PLAID_PRODUCTS:
             self.products.append(Products(product))
 
+        self.cache = RESPONSE_CACHE
+        self.rate_limiter = RATE_LIMITER
+        self.circuit_breakers = CIRCUIT_BREAKERS
+        self.instrumentation = INSTRUMENTATION
+        self.retry_policy = RetryPolicy(max_retries=self.PLAID_MAX_RETRIES)
+        self._store = None
+        self._store_lock = threading.Lock()
+
+    @property
+    def store(self):
+        # worker threads may be first to ask, and must all get the same store
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = TransactionStore(self.STORE_PATH)
+        return self._store
+
+    @property
+    def archive(self):
+        from transaction_archive import TransactionArchive
+
+        return TransactionArchive(self.ARCHIVE_PATH)
+
+    def call(self, endpoint, request):
+        """
+        sends request through the PlaidApi method named endpoint with the
+        configured (connect, read) timeouts.  every call waits for its slot
+        in the endpoint and item token buckets, and retryable errors
+        (rate limits, PRODUCT_NOT_READY, plaid side failures) are retried
+        with jittered exponential backoff that honours Retry-After.  an
+        endpoint whose circuit breaker is open raises CircuitOpenError
+        without being called.  the whole call, retries included, is one
+        'endpoint' measurement for the instrumentation exporters
+        """
+        access_token = request.get('access_token')
+        item = token_key(access_token) if access_token else None
+        breaker = self.circuit_breakers[endpoint]
+        attempt = 0
+        with self.instrumentation.span('endpoint', endpoint) as span:
+            while True:
+                probe = breaker.before_call()
+                try:
+                    wait = self.rate_limiter.acquire(endpoint, item)
+                    if wait:
+                        time.sleep(wait)
+                    response = getattr(self.client, endpoint)(
+                        request, _request_timeout=(self.PLAID_CONNECT_TIMEOUT, self.PLAID_READ_TIMEOUT))
+                except Exception as e:
+                    if is_endpoint_failure(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                    if span:
+                        span.retries = attempt
+                    if not is_api_exception(e):
+                        raise
+                    if is_rate_limited(e):
+                        self.rate_limiter.penalize(endpoint, item)
+                    delay = self.retry_policy.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+                except BaseException:
+                    # interrupted: a half open probe must not stay claimed
+                    if probe:
+                        breaker.release()
+                    raise
+                breaker.record_success()
+                self.rate_limiter.reward(endpoint, item)
+                if span:
+                    from client_registry import last_payload_size
+
+                    span.retries = attempt
+                    span.rows = response_rows(response)
+                    span.bytes = last_payload_size()
+                return response
+
     def format_error(self, e):
         response = json.loads(e.body)
         return {'error': {'status_code': e.status, 'display_message':
             response['error_message'], 'error_code': response['error_code'], 'error_type': response['error_type']}}
 
     def get_accounts(self):
+        """
+        /accounts/get, cached per access token for PLAID_ACCOUNTS_TTL seconds
+        """
+        try:
+            return self.cache.get_or_fetch('accounts', self.ACCESS_TOKEN, self._fetch_accounts,
+                                           self.PLAID_ACCOUNTS_TTL, cacheable=self._is_response)
+        except CircuitOpenError as e:
+            return self._serve_stale('accounts', e)
+
+    def _fetch_accounts(self):
+        import plaid
+        from plaid.model.accounts_get_request import AccountsGetRequest
+
         try:
             request = AccountsGetRequest(
                 access_token=self.ACCESS_TOKEN
             )
-            response = self.client.accounts_get(request)
+            response = self.call('accounts_get', request)
+            self.store.upsert_accounts(self.ACCESS_TOKEN, response.to_dict()['accounts'])
 
             return response
         except plaid.ApiException as e:
@@ -64,23 +238,68 @@ class plaid_interface():
             return error_response
 
     def get_balance(self):
+        """
+        /accounts/balance/get, cached per access token for PLAID_BALANCE_TTL
+        seconds.  concurrent callers share the request already in flight
+        """
+        try:
+            return self.cache.get_or_fetch('balance', self.ACCESS_TOKEN, self._fetch_balance,
+                                           self.PLAID_BALANCE_TTL, cacheable=self._is_response)
+        except CircuitOpenError as e:
+            return self._serve_stale('balance', e)
+
+    def _fetch_balance(self):
+        import plaid
+        from plaid.model.accounts_balance_get_request import AccountsBalanceGetRequest
+
         try:
             request = AccountsBalanceGetRequest(
                 access_token=self.ACCESS_TOKEN
             )
-            response = self.client.accounts_balance_get(request)
+            response = self.call('accounts_balance_get', request)
+            accounts = response.to_dict()['accounts']
+            self.store.upsert_accounts(self.ACCESS_TOKEN, accounts)
+            self.store.record_balances(self.ACCESS_TOKEN, accounts)
 
             return response
         except plaid.ApiException as e:
             error_response = self.format_error(e)
             return error_response
 
+    def invalidate_cache(self, kind=None):
+        """
+        drops the cached 'accounts' and/or 'balance' responses for this
+        access token, e.g. after a webhook reports new activity
+        """
+        self.cache.invalidate(access_token=self.ACCESS_TOKEN, kind=kind)
+
+    def _serve_stale(self, kind, e):
+        """
+        while an endpoint's circuit is open, hands back the last cached
+        response however old it is, or an error dict if there is none
+        """
+        response, age = self.cache.peek(kind, self.ACCESS_TOKEN)
+        if response is not None:
+            logger.warning('%s; serving %s cached %.0fs ago', e, kind, age)
+            return response
+        return self._circuit_open_error(e)
+
+    @staticmethod
+    def _circuit_open_error(e):
+        return {'error': {'status_code': None, 'display_message': str(e), 'error_code': 'CIRCUIT_OPEN',
+                          'error_type': 'API_ERROR'}}
+
+    @staticmethod
+    def _is_response(response):
+        return not (isinstance(response, dict) and 'error' in response)
 
     def get_plaid_accounts(self):
         """
         retrieves all plaid connected accounts
         """
-        account_list = self.get_accounts(self.token)
+        import pandas as pd
+
+        account_list = self.get_accounts()
         acct_names = []
         acct_balances = []
         acct_ids = []
@@ -93,60 +312,506 @@ class plaid_interface():
                             columns=['Account_ID', 'Account_Name', 'Balance'])
 
     @staticmethod
-    def get_date_range(option="m", periods=1):
+    def get_date_range(option="m", periods=1, end=None, anchor=None):
         """
         reads in number of periods and type of unit:
         m - month
+        w - weeks
         d - days
-        Then returns a list of dates ranging from today and tracking back
-        that many periods
+        Then returns a DatetimeIndex of dates ranging from end (today by
+        default) and tracking back that many periods, newest first
 
         Example:  If today is 2022-10-01, 5 periods by month yields
-        '2022-05-01' through '2022-10-01'
+        '2022-09-01' back to '2022-05-01'
+
+        With an anchor ('month_start', 'month_end' or 'week', which is
+        mondays) the dates are instead the last periods anchor dates on or
+        before end
         """
+        import numpy as np
+        import pandas as pd
 
-        date_list = []
-        start_date = datetime.today()
-        date = start_date
+        end = np.datetime64(pd.Timestamp(end if end is not None else datetime.today()).date(), 'D')
+        if anchor is not None:
+            offset, arguments = DATE_ANCHORS[anchor]
+            freq = getattr(pd.offsets, offset)(**arguments)
+            return pd.date_range(end=end, periods=periods, freq=freq)[::-1]
 
-        for period in range(periods):
-            if option == 'd':
-                date = date - relativedelta(days=1)
-            else:
-                date = date - relativedelta(months=1)
-            date_list.append(date.date())
-        return date_list
+        steps = np.arange(1, periods + 1)
+        if option == 'd':
+            dates = end - steps
+        elif option == 'w':
+            dates = end - 7 * steps
+        else:
+            dates = shift_months(end, -steps)
+        return pd.DatetimeIndex(dates)
+
+    def get_account_history(self, option='m', periods=1, sync=False, max_in_flight=None, use_store=True,
+                            archive=False, compact=False, normalizer=None, categorizer=None):
+        """
+        answers the date range from the local store, fetching only the
+        windows it does not hold yet (up to max_in_flight at once).  with
+        sync=True the store is brought up to date through /transactions/sync
+        instead.  use_store=False skips the store and downloads every window.
+        archive=True also appends the result to the parquet archive and
+        compact=True casts it to the compact dtypes of transaction_schema.
+        a merchant_normalization.MerchantNormalizer adds a canonical merchant
+        column and a categorization.Categorizer a budget_category column (both
+        kept out of the archive).  each step is timed as an instrumentation
+        'stage'
+        """
+        from transaction_decoder import decode_transactions
+        from transaction_schema import compact_frame
 
-    def get_account_history(self, option='m', periods=1):
+        instrumentation = self.instrumentation
 
         date_range = self.get_date_range(periods=periods, option=option)
-        date_query_list = []
-        for date in date_range:
-            if date < datetime.now().date():
-                date_query_list.append(date)
+        windows = self.plan_query_windows(date_range, option=option)
+
+        if sync:
+            sync_result = self.sync_transactions()
+            if 'error' in sync_result:
+                if sync_result['error']['error_code'] != 'CIRCUIT_OPEN':
+                    return sync_result
+                logger.warning('%s; answering from the local store', sync_result['error']['display_message'])
+            with instrumentation.span('stage', 'store_read') as span:
+                transactions = self.store.get_transactions(self.ACCESS_TOKEN, start=date_range.min().date())
+                if span:
+                    span.rows = len(transactions)
+        elif not use_store:
+            history_concat_list = self.fetch_windows(windows, max_in_flight=max_in_flight)
+            with instrumentation.span('stage', 'dedupe') as span:
+                transactions = self.dedupe_transactions(history_concat_list)
+                if span:
+                    span.rows = len(transactions)
+        elif windows:
+            self.refresh_windows(self.store.missing_windows(self.ACCESS_TOKEN, windows), max_in_flight=max_in_flight)
+            with instrumentation.span('stage', 'store_read') as span:
+                transactions = self.store.get_transactions(self.ACCESS_TOKEN, start=windows[-1][0], end=windows[0][1])
+                if span:
+                    span.rows = len(transactions)
+        else:
+            transactions = []
+
+        with instrumentation.span('stage', 'decode') as span:
+            history = decode_transactions(transactions)
+            if span:
+                span.rows = len(history)
+        if archive:
+            with instrumentation.span('stage', 'archive') as span:
+                self.archive.append(history)
+                if span:
+                    span.rows = len(history)
+        if compact:
+            with instrumentation.span('stage', 'compact') as span:
+                history = compact_frame(history)
+                if span:
+                    span.rows = len(history)
+        if normalizer is not None:
+            with instrumentation.span('stage', 'normalize_merchants') as span:
+                history['merchant'] = normalizer.normalize(history['name'])
+                if span:
+                    span.rows = len(history)
+        if categorizer is not None:
+            with instrumentation.span('stage', 'categorize') as span:
+                history['budget_category'] = categorizer.categorize(history)
+                if span:
+                    span.rows = len(history)
+        return history
+
+    def get_monthly_summary(self, periods=12, sync=False, account_ids=None, max_in_flight=None):
+        """
+        spend per account, top level category and month over the last
+        periods months, read from the store's materialized monthly_summaries
+        (one row per account, category and month) rather than from the raw
+        transactions.  whole calendar months are reported, so the oldest one
+        also counts the days before the range starts.  missing windows are
+        fetched first, or with sync=True the store is synced.  returns a
+        DataFrame, amounts in cents
+        """
+        import pandas as pd
+
+        columns = ['account_id', 'category', 'month', 'currency', 'outflow_cents', 'inflow_cents', 'transaction_count']
+        windows = self.plan_query_windows(self.get_date_range(periods=periods, option='m'), option='m')
+        if not windows:
+            return pd.DataFrame([], columns=columns)
+        if sync:
+            sync_result = self.sync_transactions()
+            if 'error' in sync_result and sync_result['error']['error_code'] != 'CIRCUIT_OPEN':
+                return sync_result
+        else:
+            self.refresh_windows(self.store.missing_windows(self.ACCESS_TOKEN, windows), max_in_flight=max_in_flight)
+
+        with self.instrumentation.span('stage', 'store_read') as span:
+            rows = self.store.get_monthly_summaries(self.ACCESS_TOKEN, start=windows[-1][0], end=windows[0][1],
+                                                    account_ids=account_ids)
+            if span:
+                span.rows = len(rows)
+        return pd.DataFrame(rows, columns=columns)
+
+    def get_net_worth(self, option='m', periods=12, **history_options):
+        """
+        daily balances of every account and the net worth over the date
+        range, as a net_worth.BalanceSeries in cents: the current balances
+        (recorded as a snapshot on the way) back-filled through the
+        transaction history.  history_options go to get_account_history.
+        returns an error dict if either call fails
+        """
+        from net_worth import reconstruct_balances
 
-        history_concat_list = []
+        balance = self.get_balance()
+        if 'error' in balance:
+            return balance
+        history = self.get_account_history(option=option, periods=periods, **history_options)
+        if isinstance(history, dict):
+            return history
+        with self.instrumentation.span('stage', 'net_worth') as span:
+            # an empty range (periods=0) has a NaT min, i.e. no lower bound
+            series = reconstruct_balances(history, balance['accounts'],
+                                          start=self.get_date_range(option, periods).min())
+            if span:
+                span.rows = len(history)
+        return series
 
-        for date in date_query_list:
-            trns_history = self.get_transactions_from_plaid(start=date, end=date + relativedelta(months=1))
-            history_concat_list.append(trns_history)
+    def get_balance_history(self, start=None, end=None):
+        """
+        the balances /accounts/balance/get actually reported over time, one
+        point per day from the recorded snapshots, as a BalanceSeries
+        """
+        from net_worth import snapshot_series
+
+        return snapshot_series(self.store.get_balance_snapshots(self.ACCESS_TOKEN, start=start, end=end))
+
+    @staticmethod
+    def plan_query_windows(date_range, option='m', today=None):
+        """
+        turns the dates from get_date_range into non-overlapping (start, end)
+        windows, newest first.  each date covers the span up to the next
+        period and the newest one up to today (a month back from the 31st
+        and forward again lands before it).  touching or overlapping spans
+        are merged, and the merged spans are cut back into chunks of at most
+        one month so they can still be fetched in parallel.  both ends of a
+        window are inclusive
+        """
+        import numpy as np
+
+        today = np.datetime64(today or datetime.now().date(), 'D')
+        starts = np.sort(np.asarray(date_range, dtype='datetime64[D]'))
+        starts = starts[starts < today]
+        if not len(starts):
+            return []
+        if option == 'd':
+            ends = starts + 1
+        elif option == 'w':
+            ends = starts + 7
+        else:
+            # a date on the last of its month may have been clamped there
+            # (march 30th less a month), so it covers the next month in full
+            months = starts.astype('datetime64[M]')
+            month_ends = (months + 1).astype('datetime64[D]') - 1
+            ends = np.where(starts == month_ends, (months + 2).astype('datetime64[D]') - 1,
+                            shift_months(starts, 1))
+        ends = np.minimum(ends, today)
+        ends[-1] = today
+
+        # a span opens a new window when it starts more than a day after
+        # every span before it has ended
+        reach = np.maximum.accumulate(ends)
+        opens = np.ones(len(starts), dtype=bool)
+        opens[1:] = starts[1:] > reach[:-1] + 1
+        merged_ends = np.maximum.reduceat(ends, np.flatnonzero(opens))
+
+        windows = []
+        for start, end in zip(starts[opens].tolist(), merged_ends.tolist()):
+            windows.extend(plaid_interface.split_window(start, end))
+        return windows[::-1]
+
+    @staticmethod
+    def split_window(start, end):
+        """
+        cuts start..end (inclusive) into consecutive chunks of at most one
+        month, oldest first
+        """
+        from dateutil.relativedelta import relativedelta
+
+        windows = []
+        while start <= end:
+            window_end = min(start + relativedelta(months=1), end)
+            windows.append((start, window_end))
+            start = window_end + timedelta(days=1)
+        return windows
+
+    @staticmethod
+    def dedupe_transactions(history_concat_list):
+        """
+        flattens the window responses into one transaction list, keeping the
+        first copy of each transaction_id
+        """
+        seen = set()
+        transactions = []
+        for trns_history in history_concat_list:
+            if trns_history is None:
+                continue
+            for transaction in trns_history['transactions']:
+                if transaction['transaction_id'] not in seen:
+                    seen.add(transaction['transaction_id'])
+                    transactions.append(transaction)
+        return transactions
+
+    def fetch_windows(self, windows, max_in_flight=None):
+        """
+        fetches each (start, end) window with at most max_in_flight requests
+        outstanding.  results come back in the same order as windows, each a
+        dict of the plaid model 'transactions' and 'accounts' for the window.
+        a window that fails because plaid is degraded (or its circuit is
+        open) comes back as None, so batch jobs finish with partial data
+        """
+        max_in_flight = max_in_flight or self.PLAID_MAX_IN_FLIGHT
+        with self.instrumentation.span('stage', 'fetch') as span:
+            if max_in_flight <= 1 or len(windows) <= 1:
+                history_concat_list = [self._fetch_window(start, end) for start, end in windows]
+            else:
+                with ThreadPoolExecutor(max_workers=min(max_in_flight, len(windows))) as executor:
+                    history_concat_list = list(executor.map(lambda window: self._fetch_window(*window), windows))
+            if span:
+                span.rows = sum(len(trns_history['transactions'])
+                                for trns_history in history_concat_list if trns_history is not None)
+        return history_concat_list
+
+    def _fetch_window(self, start, end):
+        trns_history = {'transactions': [], 'accounts': []}
+        try:
+            for response in self._iter_transaction_pages(start, end):
+                trns_history['transactions'].extend(response['transactions'])
+                trns_history['accounts'] = trns_history['accounts'] or response['accounts']
+        except Exception as e:
+            if not is_endpoint_failure(e):
+                raise
+            logger.warning('skipping window %s..%s: %s', start, end, e)
+            return None
+        return trns_history
+
+    def refresh_windows(self, windows, max_in_flight=None):
+        """
+        fetches the windows and writes them to the store.  windows ending in
+        the last PLAID_REFETCH_DAYS days are still settling, so they are not
+        marked complete and get fetched again on the next call
+        """
+        settled = datetime.now().date() - timedelta(days=self.PLAID_REFETCH_DAYS)
+        history_concat_list = self.fetch_windows(windows, max_in_flight=max_in_flight)
+        for (start, end), trns_history in zip(windows, history_concat_list):
+            if trns_history is None:
+                continue
+            with self.instrumentation.span('stage', 'to_dict') as span:
+                transactions = [transaction.to_dict() for transaction in trns_history['transactions']]
+                accounts = [account.to_dict() for account in trns_history['accounts']]
+                if span:
+                    span.rows = len(transactions)
+            with self.instrumentation.span('stage', 'store_write') as span:
+                self.store.replace_window(self.ACCESS_TOKEN, start, end, transactions, complete=end < settled)
+                self.store.upsert_accounts(self.ACCESS_TOKEN, accounts)
+                if span:
+                    span.rows = len(transactions)
+
+    def sync_transactions(self):
+        """
+        pulls everything added, modified or removed since the cursor saved for
+        this access token and applies it to the local store.  a sync that is
+        interrupted by TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION restarts
+        from the saved cursor
+        """
+        import plaid
+        from plaid.model.transactions_sync_request import TransactionsSyncRequest
+
+        start_cursor = self.store.get_cursor(self.ACCESS_TOKEN)
+        with self.instrumentation.span('stage', 'fetch') as span:
+            while True:
+                try:
+                    added, modified, removed = [], [], []
+                    cursor = start_cursor
+                    has_more = True
+                    while has_more:
+                        request = TransactionsSyncRequest(
+                            access_token=self.ACCESS_TOKEN,
+                            count=min(self.PLAID_PAGE_SIZE, PLAID_MAX_PAGE_SIZE)
+                        )
+                        if cursor:
+                            request.cursor = cursor
+                        response = self.call('transactions_sync', request)
+                        added.extend(transaction.to_dict() for transaction in response['added'])
+                        modified.extend(transaction.to_dict() for transaction in response['modified'])
+                        removed.extend(transaction['transaction_id'] for transaction in response['removed'])
+                        cursor = response['next_cursor']
+                        has_more = response['has_more']
+                    break
+                except CircuitOpenError as e:
+                    return self._circuit_open_error(e)
+                except plaid.ApiException as e:
+                    error_response = self.format_error(e)
+                    if error_response['error']['error_code'] != 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION':
+                        return error_response
+            if span:
+                span.rows = len(added) + len(modified) + len(removed)
 
-        return pd.json_normalize(history_concat_list, record_path=['transactions'])
+        with self.instrumentation.span('stage', 'store_write') as span:
+            self.store.apply_sync(self.ACCESS_TOKEN, added, modified, removed, cursor)
+            if span:
+                span.rows = len(added) + len(modified) + len(removed)
+        return {'added': len(added), 'modified': len(modified), 'removed': len(removed), 'next_cursor': cursor}
 
-    def get_transactions_from_plaid(self, start=None, end=None):
+    def get_transactions_from_plaid(self, start=None, end=None, page_size=None):
+        """
+        retrieves every transaction between start and end, walking the
+        /transactions/get offset until total_transactions is reached
+        """
         if start is not None:
-            options = TransactionsGetRequestOptions(count=500)
-            request = TransactionsGetRequest(
-                access_token=self.ACCESS_TOKEN,
-                start_date=start,
-                end_date=end,
-                options=options
-            )
-            response = self.client.transactions_get(request)
-            response_dict = response.to_dict()
+            response_dict = None
+            for response in self._iter_transaction_pages(start, end, page_size=page_size):
+                page_dict = response.to_dict()
+                if response_dict is None:
+                    response_dict = page_dict
+                else:
+                    response_dict['transactions'].extend(page_dict['transactions'])
             return response_dict
 
+    def iter_transactions(self, start, end=None, batch_size=None, page_size=None):
+        """
+        yields the transactions between start and end (inclusive, end
+        defaults to today) as decoded DataFrames of batch_size rows, the
+        last one possibly shorter.  batches are cut as pages arrive, newest
+        window first, so only one batch and one page are ever held and a
+        multi-year history can be piped into storage in constant memory
+        """
+        import pandas as pd
+        from transaction_decoder import decode_transactions
+
+        start = pd.Timestamp(start).date()
+        end = pd.Timestamp(end).date() if end is not None else datetime.now().date()
+        batch_size = batch_size or self.PLAID_PAGE_SIZE
+
+        batch = []
+        for window_start, window_end in reversed(self.split_window(start, end)):
+            # offsets can shift while a window is paged, so drop repeats
+            seen = set()
+            for response in self._iter_transaction_pages(window_start, window_end, page_size=page_size):
+                for transaction in response['transactions']:
+                    if transaction['transaction_id'] in seen:
+                        continue
+                    seen.add(transaction['transaction_id'])
+                    batch.append(transaction)
+                    if len(batch) >= batch_size:
+                        yield decode_transactions(batch)
+                        batch = []
+        if batch:
+            yield decode_transactions(batch)
+
+    def _iter_transaction_pages(self, start, end, page_size=None):
+        """
+        yields one /transactions/get response per page.  the next page is
+        requested in the background while the caller decodes the current one
+        """
+        page_size = min(page_size or self.PLAID_PAGE_SIZE, PLAID_MAX_PAGE_SIZE)
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            response = self._request_transactions_page(start, end, 0, page_size)
+            offset = len(response['transactions'])
+            while True:
+                next_page = None
+                if response['transactions'] and offset < response['total_transactions']:
+                    next_page = prefetcher.submit(self._request_transactions_page, start, end, offset, page_size)
+                yield response
+                if next_page is None:
+                    return
+                response = next_page.result()
+                offset += len(response['transactions'])
+
+    def _request_transactions_page(self, start, end, offset, count):
+        from plaid.model.transactions_get_request import TransactionsGetRequest
+        from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+
+        options = TransactionsGetRequestOptions(count=count, offset=offset)
+        request = TransactionsGetRequest(
+            access_token=self.ACCESS_TOKEN,
+            start_date=start,
+            end_date=end,
+            options=options
+        )
+        return self.call('transactions_get', request)
+
+    def for_item(self, access_token):
+        """
+        returns a copy of this interface bound to another access token.  the
+        copy shares the api client and its connection pool, the response
+        cache and the local store (opened here if it is not open yet)
+        """
+        item = copy.copy(self)
+        item._store = self.store
+        item.ACCESS_TOKEN = access_token
+        return item
+
+    def get_items_history(self, access_tokens, option='m', periods=1, max_items_in_flight=None, **history_options):
+        """
+        fetches balances and transaction history for many linked items, at
+        most max_items_in_flight items at a time.  returns (history, errors):
+        one DataFrame of every item's transactions joined to its account
+        names and balances and tagged with item_key, and a dict of item_key
+        to the error dict of each item that failed.  a failing item never
+        aborts the rest of the batch
+        """
+        import pandas as pd
 
+        access_tokens = list(dict.fromkeys(access_tokens))
+        max_items_in_flight = max_items_in_flight or self.PLAID_MAX_ITEMS_IN_FLIGHT
+        # the copies are made here, on the calling thread, so they all share
+        # one store opened once
+        items = [self.for_item(access_token) for access_token in access_tokens]
+        with ThreadPoolExecutor(max_workers=max(1, min(max_items_in_flight, len(access_tokens)))) as executor:
+            results = list(executor.map(
+                lambda item: item._get_item_history(option, periods, history_options), items
+            ))
+
+        frames = []
+        errors = {}
+        for access_token, (history, error) in zip(access_tokens, results):
+            if error is not None:
+                errors[token_key(access_token)] = error
+            else:
+                frames.append(history)
+        if not frames:
+            return pd.DataFrame(), errors
+
+        history = pd.concat(frames, ignore_index=True)
+        # concat falls back to object when the items' categories differ
+        for column in frames[0].columns:
+            if isinstance(frames[0][column].dtype, pd.CategoricalDtype) or column in ITEM_TAG_COLUMNS:
+                history[column] = history[column].astype('category')
+        return history, errors
+
+    def _get_item_history(self, option, periods, history_options):
+        import plaid
+        import pandas as pd
+
+        try:
+            balance = self.get_balance()
+            if 'error' in balance:
+                return None, balance
+            history = self.get_account_history(option=option, periods=periods, **history_options)
+            if isinstance(history, dict):
+                return None, history
+        except plaid.ApiException as e:
+            return None, self.format_error(e)
+        except Exception as e:
+            return None, {'error': {'status_code': None, 'display_message': str(e),
+                                    'error_code': type(e).__name__, 'error_type': 'CLIENT_ERROR'}}
+
+        accounts = pd.DataFrame(
+            [(account['account_id'], account['name'], str(account['type']), account['balances']['current'],
+              account['balances']['available']) for account in balance['accounts']],
+            columns=['account_id', 'account_name', 'account_type', 'balance_current', 'balance_available']
+        )
+        history = history.merge(accounts.astype({'account_id': history['account_id'].dtype}),
+                                on='account_id', how='left')
+        history.insert(0, 'item_key', token_key(self.ACCESS_TOKEN))
+        return history, None
 
 
 if __name__ == "__main__":
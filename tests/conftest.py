@@ -0,0 +1,68 @@
+import os
+import sys
+
+import pytest
+
+# the modules under source/ import each other by bare name, and the mock
+# plaid server lives with the benchmarks
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'source'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+class Clock():
+    """
+    stand-in for time.monotonic that only moves when a test sets now
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture(scope='module')
+def mock_plaid():
+    """
+    one server per test module; it counts requests, so compare deltas
+    """
+    from mock_plaid_server import MockPlaidServer
+
+    with MockPlaidServer(transactions=1200, days=120) as server:
+        yield server
+
+
+@pytest.fixture
+def interface(mock_plaid, monkeypatch, tmp_path):
+    """
+    a plaid_interface talking to mock_plaid, with its own store, cache,
+    limits and breakers and retries that do not sleep
+    """
+    from circuit_breaker import CircuitBreakers
+    from rate_limiting import RateLimiter, RetryPolicy
+    from response_cache import ResponseCache
+    from wealth_builder_tools import plaid_interface
+
+    monkeypatch.setenv('PLAID_HOST', mock_plaid.url)
+    monkeypatch.setenv('PLAID_ENV', 'sandbox')
+    monkeypatch.setenv('PLAID_CLIENT_ID', 'client')
+    monkeypatch.setenv('PLAID_SECRET', 'secret')
+    monkeypatch.setenv('PLAID_ACCESS_TOKEN', 'access-sandbox-test')
+    monkeypatch.setenv('PLAID_PRODUCTS', 'transactions')
+    monkeypatch.setenv('PLAID_COUNTRY_CODES', 'US')
+    monkeypatch.setenv('WEALTHBUILDER_DB', str(tmp_path / 'store.db'))
+    monkeypatch.setenv('WEALTHBUILDER_ARCHIVE', str(tmp_path / 'archive'))
+    interface = plaid_interface()
+    interface.cache = ResponseCache()
+    interface.rate_limiter = RateLimiter(endpoint_rate_per_minute=10 ** 9, item_rate_per_minute=10 ** 9)
+    interface.circuit_breakers = CircuitBreakers()
+    interface.retry_policy = RetryPolicy(base_delay=0.0)
+    yield interface
+    if interface._store is not None:
+        interface._store.close()
@@ -0,0 +1,134 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from categorization import NO_MATCH, Categorizer, Rule, _Sequential
+
+
+RULES = [
+    Rule('Coffee', r'starbucks|peet'),
+    Rule('Big groceries', r'whole foods', min_amount=100),
+    Rule('Groceries', r'whole foods|trader joe'),
+    Rule('Card payment', None, max_amount=-500, account_ids=['acc-2']),
+    Rule('Rides', r'\buber\b(?! eats)'),
+    Rule('Delivery', r'uber eats|doordash'),
+]
+
+MERCHANTS = ['Starbucks', 'STARBUCKS #1234', 'Whole Foods', 'Trader Joe', 'Uber', 'Uber Eats', 'DoorDash',
+             'Peets Coffee', 'Shell', None]
+
+
+def frame(count=500, seed=0):
+    random = np.random.default_rng(seed)
+    names = random.choice(np.array(MERCHANTS, dtype=object), count)
+    return pd.DataFrame({
+        'transaction_id': ['t%d' % i for i in range(count)],
+        'merchant_name': pd.Series(names, dtype=object).where(random.random(count) < 0.7),
+        'name': names,
+        'amount_cents': random.integers(-100000, 30000, count),
+        'account_id': random.choice(['acc-1', 'acc-2'], count),
+    })
+
+
+def loop_oracle(rules, frame, ignore_case=True):
+    """
+    the rules applied one row and one rule at a time
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    result = []
+    for row in frame.itertuples():
+        text = row.merchant_name if isinstance(row.merchant_name, str) else row.name
+        for index, rule in enumerate(rules):
+            if rule.merchant is not None and not (isinstance(text, str) and re.search(rule.merchant, text, flags)):
+                continue
+            if rule.min_amount is not None and row.amount_cents < round(rule.min_amount * 100):
+                continue
+            if rule.max_amount is not None and row.amount_cents > round(rule.max_amount * 100):
+                continue
+            if rule.account_ids is not None and row.account_id not in rule.account_ids:
+                continue
+            result.append(index)
+            break
+        else:
+            result.append(NO_MATCH)
+    return np.array(result, dtype=np.int64)
+
+
+@pytest.mark.parametrize('ignore_case', [True, False])
+def test_matches_loop_oracle(ignore_case):
+    transactions = frame()
+    categorizer = Categorizer(RULES, ignore_case=ignore_case)
+    assert isinstance(categorizer.combined, re.Pattern)
+    np.testing.assert_array_equal(categorizer.rule_indexes(transactions), loop_oracle(RULES, transactions, ignore_case))
+
+
+def test_categorize_names_categories():
+    transactions = frame(50)
+    categories = Categorizer(RULES).categorize(transactions)
+    expected = [RULES[index].category if index != NO_MATCH else None for index in loop_oracle(RULES, transactions)]
+    assert categories.index.equals(transactions.index)
+    assert [None if pd.isna(value) else value for value in categories] == expected
+
+
+@pytest.mark.parametrize('rules', [
+    # a numbered backreference would point at another branch's group
+    [Rule('Doubled', r'(\w)\1'), Rule('Coffee', r'starbucks')],
+    # the same group name in two rules cannot be joined
+    [Rule('A', r'(?P<word>star)'), Rule('B', r'(?P<word>uber)')],
+])
+def test_sequential_fallback(rules):
+    transactions = frame(200)
+    categorizer = Categorizer(rules)
+    assert isinstance(categorizer.combined, _Sequential)
+    np.testing.assert_array_equal(categorizer.rule_indexes(transactions), loop_oracle(rules, transactions))
+
+
+def test_cache_hits_skip_evaluation(monkeypatch):
+    transactions = frame(100)
+    categorizer = Categorizer(RULES)
+    first = categorizer.rule_indexes(transactions)
+    assert len(categorizer.cached_ids) == len(transactions)
+
+    def evaluate(*args):
+        raise AssertionError('cached rows were evaluated again')
+    monkeypatch.setattr(categorizer, '_evaluate', evaluate)
+    np.testing.assert_array_equal(categorizer.rule_indexes(transactions.iloc[::-1]), first[::-1])
+
+
+def test_cache_reevaluates_modified_and_new_rows():
+    transactions = frame(100)
+    categorizer = Categorizer(RULES)
+    categorizer.rule_indexes(transactions)
+
+    changed = transactions.copy()
+    changed.loc[:9, 'merchant_name'] = 'Trader Joe'
+    changed.loc[10:19, 'amount_cents'] = 50000
+    changed.loc[20:29, 'account_id'] = 'acc-3'
+    extra = frame(20, seed=1)
+    extra['transaction_id'] = ['new-%d' % i for i in range(20)]
+    changed = pd.concat([changed, extra], ignore_index=True)
+
+    np.testing.assert_array_equal(categorizer.rule_indexes(changed), loop_oracle(RULES, changed))
+    assert len(categorizer.cached_ids) == len(changed)
+    # and the cache now holds the new results
+    np.testing.assert_array_equal(categorizer.rule_indexes(changed), loop_oracle(RULES, changed))
+
+
+def test_rule_change_clears_cache():
+    transactions = frame(100)
+    categorizer = Categorizer(RULES)
+    categorizer.rule_indexes(transactions)
+    categorizer.set_rules(RULES)
+    assert len(categorizer.cached_ids) == len(transactions)
+
+    rules = RULES[::-1]
+    categorizer.set_rules(rules)
+    assert len(categorizer.cached_ids) == 0
+    np.testing.assert_array_equal(categorizer.rule_indexes(transactions), loop_oracle(rules, transactions))
+
+
+def test_bad_pattern_names_rule():
+    with pytest.raises(ValueError, match='rule 1'):
+        Categorizer([Rule('Ok', 'a'), Rule('Broken', '(')])
@@ -0,0 +1,179 @@
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitBreakers, CircuitOpenError, is_endpoint_failure
+
+
+def tripped(clock, threshold=3, reset_timeout=30.0):
+    breaker = CircuitBreaker('accounts_get', threshold, reset_timeout, clock=clock)
+    for _ in range(threshold):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker('accounts_get', failure_threshold=3, clock=clock)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_success()
+    # the success reset the count, so two more failures keep it closed
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+
+def test_open_fails_fast_until_reset_timeout(clock):
+    breaker = tripped(clock)
+    clock.now = 10.0
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.endpoint == 'accounts_get'
+    assert error.value.retry_in == pytest.approx(20.0)
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = tripped(clock)
+    clock.now = 30.0
+    breaker.before_call()
+    assert breaker.state == 'half_open'
+    # everyone else fails fast while the probe is out
+    for _ in range(3):
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+
+def test_successful_probe_closes(clock):
+    breaker = tripped(clock)
+    clock.now = 31.0
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    for _ in range(5):
+        breaker.before_call()
+
+
+def test_failed_probe_reopens_for_a_full_timeout(clock):
+    breaker = tripped(clock)
+    clock.now = 45.0
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.now = 74.0
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_in == pytest.approx(1.0)
+    clock.now = 75.0
+    breaker.before_call()
+    assert breaker.state == 'half_open'
+
+
+def test_one_breaker_per_endpoint():
+    breakers = CircuitBreakers(failure_threshold=2)
+    assert breakers['accounts_get'] is breakers['accounts_get']
+    assert breakers['accounts_get'] is not breakers['transactions_get']
+
+
+def test_endpoint_failures():
+    assert is_endpoint_failure(CircuitOpenError('accounts_get', 1.0))
+    assert is_endpoint_failure(ConnectionResetError())
+    assert not is_endpoint_failure(ValueError())
+
+
+def test_lost_probe_is_given_up_after_reset_timeout(clock):
+    breaker = tripped(clock)
+    clock.now = 30.0
+    assert breaker.before_call()
+    # the probe never records an outcome
+    clock.now = 59.0
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_in == pytest.approx(1.0)
+    clock.now = 60.0
+    assert breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert not breaker.before_call()
+
+
+def test_released_probe_reopens(clock):
+    breaker = tripped(clock)
+    clock.now = 30.0
+    breaker.before_call()
+    breaker.release()
+    assert breaker.state == 'open'
+    clock.now = 59.0
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now = 60.0
+    assert breaker.before_call()
+
+
+def test_release_outside_a_probe_changes_nothing(clock):
+    breaker = CircuitBreaker('accounts_get', failure_threshold=3, clock=clock)
+    assert not breaker.before_call()
+    breaker.release()
+    assert breaker.state == 'closed'
+
+
+@pytest.fixture
+def plaid_env(monkeypatch):
+    monkeypatch.setenv('PLAID_ENV', 'sandbox')
+    monkeypatch.setenv('PLAID_PRODUCTS', 'transactions')
+    monkeypatch.setenv('PLAID_COUNTRY_CODES', 'US')
+    monkeypatch.setenv('PLAID_CLIENT_ID', 'client')
+    monkeypatch.setenv('PLAID_SECRET', 'secret')
+    monkeypatch.delenv('PLAID_HOST', raising=False)
+
+
+def test_interrupted_probe_is_released_by_call(plaid_env, clock):
+    from rate_limiting import RateLimiter
+    from wealth_builder_tools import plaid_interface
+
+    class Client():
+        def accounts_get(self, request, _request_timeout=None):
+            raise KeyboardInterrupt
+
+    interface = plaid_interface()
+    interface.client = Client()
+    interface.rate_limiter = RateLimiter()
+    breaker = tripped(clock)
+    interface.circuit_breakers = {'accounts_get': breaker}
+    clock.now = 30.0
+    with pytest.raises(KeyboardInterrupt):
+        interface.call('accounts_get', {'access_token': 'token'})
+    assert breaker.state == 'open' and not breaker.probing
+    clock.now = 60.0
+    assert breaker.before_call()
+
+
+def test_cancelled_probe_is_released_by_async_post(plaid_env, clock):
+    import asyncio
+
+    from async_plaid_interface import AsyncPlaidInterface
+    from rate_limiting import RateLimiter
+
+    class Http():
+        async def post(self, path, json=None):
+            await asyncio.Event().wait()
+
+    async def cancelled_probe():
+        interface = AsyncPlaidInterface(access_token='token')
+        await interface.aclose()
+        interface.http = Http()
+        interface.rate_limiter = RateLimiter()
+        interface.circuit_breakers = {'accounts_get': breaker}
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(interface._post('/accounts/get', {'access_token': 'token'}), 0.01)
+
+    breaker = tripped(clock)
+    clock.now = 30.0
+    asyncio.run(cancelled_probe())
+    assert breaker.state == 'open' and not breaker.probing
+    clock.now = 60.0
+    assert breaker.before_call()
@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from merchant_normalization import MerchantNormalizer, clean_name
+from transaction_store import TransactionStore
+
+
+@pytest.mark.parametrize('prefixed, bare', [
+    ('CHECKCARD 0412 7-ELEVEN 33451', '7-ELEVEN'),
+    ('VISA 3M COMPANY', '3M COMPANY'),
+    ('POS 12/31 1-800-FLOWERS', '1-800-FLOWERS'),
+    ('POS DEBIT 03/14 STARBUCKS #1234', 'STARBUCKS'),
+    ('PURCHASE AUTHORIZED ON 02/09 SHELL OIL 5743', 'SHELL OIL'),
+    ('ACH 2024-03-01 24 HOUR FITNESS', '24 HOUR FITNESS'),
+    ('SQ *BLUE BOTTLE COFFEE', 'BLUE BOTTLE COFFEE'),
+])
+def test_prefixed_and_bare_names_agree(prefixed, bare):
+    assert clean_name(prefixed) == clean_name(bare) is not None
+
+
+def test_names_that_are_only_a_prefix_are_kept():
+    assert clean_name('VISA') == 'Visa'
+    assert clean_name(None) is None
+    assert clean_name('  #1234  ') is None
+
+
+def test_normalize_through_the_store():
+    store = TransactionStore(':memory:')
+    names = pd.Series(['CHECKCARD 0412 7-ELEVEN 33451', '7-ELEVEN', None, 'VISA 3M COMPANY', '3M COMPANY'],
+                      index=[10, 11, 12, 13, 14])
+    merchants = MerchantNormalizer(store).normalize(names)
+    assert merchants.index.equals(names.index)
+    assert merchants.tolist()[:2] == ['7 Eleven', '7 Eleven']
+    assert pd.isna(merchants.iloc[2])
+    assert merchants.iloc[3] == merchants.iloc[4]
+
+    # a fresh normalizer reads the cleaned names back from the store
+    again = MerchantNormalizer(store, aliases={'7 Eleven': '7-Eleven'}).normalize(names)
+    assert again.tolist()[:2] == ['7-Eleven', '7-Eleven']
+    store.close()
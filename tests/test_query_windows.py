@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from wealth_builder_tools import plaid_interface
+
+
+def covered_days(windows):
+    days = []
+    for start, end in windows:
+        days.extend(pd.date_range(start, end).date.tolist())
+    return days
+
+
+def plan(option, periods, today, anchor=None):
+    date_range = plaid_interface.get_date_range(option=option, periods=periods, end=today, anchor=anchor)
+    return date_range, plaid_interface.plan_query_windows(date_range, option=option, today=today)
+
+
+# every day of a leap year and the month ends around it
+TODAYS = pd.date_range('2023-12-25', '2025-01-05').date.tolist()
+
+
+@pytest.mark.parametrize('option, periods, anchor', [
+    ('d', 1, None), ('d', 45, None), ('w', 1, None), ('w', 9, None), ('m', 1, None), ('m', 3, None), ('m', 13, None),
+    ('w', 4, 'week'), ('m', 3, 'month_start'), ('m', 3, 'month_end'),
+])
+def test_windows_tile_the_range_up_to_today(option, periods, anchor):
+    for today in TODAYS:
+        date_range, windows = plan(option, periods, today, anchor)
+        days = covered_days(windows[::-1])
+        # every day from the oldest date through today, once, in order
+        assert days == pd.date_range(date_range.min().date(), today).date.tolist(), today
+        assert windows[0][1] == today
+        for start, end in windows:
+            assert start <= end <= start + relativedelta(months=1)
+
+
+@pytest.mark.parametrize('today', ['2024-03-31', '2024-03-30', '2024-05-31', '2024-07-31', '2024-10-31',
+                                   '2024-12-31'])
+def test_month_end_today_is_fetched(today):
+    today = date.fromisoformat(today)
+    for periods in (1, 3):
+        _, windows = plan('m', periods, today)
+        assert windows[0][1] == today
+
+
+def test_leap_day():
+    _, windows = plan('m', 1, date(2024, 3, 31))
+    assert windows == [(date(2024, 3, 30), date(2024, 3, 31)), (date(2024, 2, 29), date(2024, 3, 29))]
+
+
+def test_separate_spans_stay_separate():
+    today = date(2024, 6, 30)
+    date_range = [date(2024, 6, 20), date(2024, 6, 10), date(2024, 6, 9), date(2024, 7, 1)]
+    windows = plaid_interface.plan_query_windows(date_range, option='d', today=today)
+    # the date after today is dropped, 6/9 and 6/10 touch and merge
+    assert windows == [(date(2024, 6, 20), today), (date(2024, 6, 9), date(2024, 6, 11))]
+
+
+def test_nothing_before_today():
+    assert plaid_interface.plan_query_windows([date(2024, 6, 30)], today=date(2024, 6, 30)) == []
+    assert plaid_interface.plan_query_windows(np.array([], dtype='datetime64[D]'), today=date(2024, 6, 30)) == []
+
+
+def test_split_window_chunks():
+    start = date(2024, 1, 31)
+    windows = plaid_interface.split_window(start, start + timedelta(days=70))
+    assert windows[0] == (date(2024, 1, 31), date(2024, 2, 29))
+    assert covered_days(windows) == pd.date_range(start, start + timedelta(days=70)).date.tolist()
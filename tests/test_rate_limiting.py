@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from rate_limiting import RateLimiter, RetryPolicy, TokenBucket, is_rate_limited
+
+
+class ApiError(Exception):
+    def __init__(self, status, error_type=None, error_code=None, headers=None):
+        self.status = status
+        self.body = json.dumps({'error_type': error_type, 'error_code': error_code}) if error_type else 'oops'
+        self.headers = headers
+
+
+def test_burst_then_queue(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # callers past the burst queue up half a second apart
+    assert [bucket.reserve() for _ in range(3)] == [0.5, 1.0, 1.5]
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock)
+    for _ in range(3):
+        bucket.reserve()
+    clock.now = 1.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.5
+    clock.now = 100.0
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+
+def test_queued_reservations_are_honoured_by_later_callers(clock):
+    bucket = TokenBucket(rate=1.0, capacity=1, clock=clock)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 1.0
+    clock.now = 0.5
+    # the token refilled so far already belongs to the queued caller
+    assert bucket.reserve() == 1.5
+
+
+def test_penalize_halves_down_to_min_rate_and_reward_recovers(clock):
+    bucket = TokenBucket(rate=32.0, capacity=1, clock=clock)
+    bucket.penalize()
+    assert bucket.rate == 16.0
+    for _ in range(10):
+        bucket.penalize()
+    assert bucket.rate == bucket.min_rate == 1.0
+    for _ in range(40):
+        bucket.reward()
+    assert bucket.rate == pytest.approx(1.0 + 40 * 32.0 / 50)
+    for _ in range(10):
+        bucket.reward()
+    assert bucket.rate == 32.0
+
+
+def test_penalized_bucket_queues_longer(clock):
+    bucket = TokenBucket(rate=4.0, capacity=1, clock=clock)
+    bucket.reserve()
+    bucket.penalize()
+    assert bucket.reserve() == 0.5
+
+
+def test_limiter_waits_for_the_tighter_bucket():
+    limiter = RateLimiter(endpoint_rate_per_minute=6000, item_rate_per_minute=30, endpoint_burst=100)
+    waits = [limiter.acquire('transactions_get', 'item-1') for _ in range(31)]
+    assert waits[:30] == [0.0] * 30
+    # one item gets 30 a minute, so the 31st waits about two seconds
+    assert waits[30] == pytest.approx(2.0, abs=0.05)
+    # another item only shares the endpoint bucket
+    assert limiter.acquire('transactions_get', 'item-2') == 0.0
+
+
+def test_limiter_penalizes_endpoint_and_item():
+    limiter = RateLimiter(endpoint_rate_per_minute=600, item_rate_per_minute=60)
+    limiter.penalize('accounts_get', 'item-1')
+    assert limiter.buckets[('accounts_get', None)].rate == 5.0
+    assert limiter.buckets[('accounts_get', 'item-1')].rate == 0.5
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_retries=2, base_delay=0.5, max_delay=30.0)
+    limited = ApiError(429, 'RATE_LIMIT_EXCEEDED', 'TRANSACTIONS_LIMIT', headers={'Retry-After': '7'})
+    assert is_rate_limited(limited)
+    assert policy.retry_delay(limited, 0) == 7.0
+    assert policy.retry_delay(limited, 2) is None
+    assert 0.0 <= policy.retry_delay(ApiError(400, 'ITEM_ERROR', 'PRODUCT_NOT_READY'), 1) <= 1.0
+    assert policy.retry_delay(ApiError(400, 'INVALID_REQUEST', 'MISSING_FIELDS'), 0) is None
+    assert policy.retry_delay(ApiError(503), 0) is not None
+    assert policy.retry_delay(ApiError(404), 0) is None
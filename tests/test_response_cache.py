@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from response_cache import ResponseCache
+
+
+def counting(value='accounts'):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return '%s-%d' % (value, len(calls))
+    return fetch, calls
+
+
+def test_value_lives_for_its_ttl(clock):
+    cache = ResponseCache(clock=clock)
+    fetch, calls = counting()
+    assert cache.get_or_fetch('accounts', 'token', fetch, ttl=60) == 'accounts-1'
+    clock.now = 59.9
+    assert cache.get_or_fetch('accounts', 'token', fetch, ttl=60) == 'accounts-1'
+    assert cache.peek('accounts', 'token') == ('accounts-1', 59.9)
+    clock.now = 60.0
+    assert cache.get_or_fetch('accounts', 'token', fetch, ttl=60) == 'accounts-2'
+    assert len(calls) == 2
+
+
+def test_keys_are_separate(clock):
+    cache = ResponseCache(clock=clock)
+    fetch, calls = counting()
+    cache.get_or_fetch('accounts', 'a', fetch, ttl=60)
+    cache.get_or_fetch('accounts', 'b', fetch, ttl=60)
+    cache.get_or_fetch('balance', 'a', fetch, ttl=60)
+    assert len(calls) == 3
+
+
+def test_uncacheable_values_are_not_kept(clock):
+    cache = ResponseCache(clock=clock)
+    fetch, calls = counting()
+    for _ in range(2):
+        cache.get_or_fetch('accounts', 'token', fetch, ttl=60, cacheable=lambda value: False)
+    assert len(calls) == 2
+    assert cache.peek('accounts', 'token') == (None, None)
+
+
+def test_invalidate_by_token_and_kind(clock):
+    cache = ResponseCache(clock=clock)
+    fetch, calls = counting()
+    for kind in ('accounts', 'balance'):
+        for token in ('a', 'b'):
+            cache.get_or_fetch(kind, token, fetch, ttl=60)
+    cache.invalidate(access_token='a', kind='balance')
+    assert cache.peek('balance', 'a') == (None, None)
+    assert cache.peek('accounts', 'a')[0] is not None
+    cache.invalidate(access_token='b')
+    assert cache.peek('accounts', 'b') == (None, None)
+    cache.invalidate()
+    assert cache.entries == {}
+
+
+def test_concurrent_callers_share_one_fetch(clock):
+    cache = ResponseCache(clock=clock)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'accounts'
+
+    with ThreadPoolExecutor(8) as executor:
+        leader = executor.submit(cache.get_or_fetch, 'accounts', 'token', fetch, 60)
+        started.wait()
+        followers = [executor.submit(cache.get_or_fetch, 'accounts', 'token', fetch, 60) for _ in range(7)]
+        # followers either wait on the leader's request or find its result
+        release.set()
+        results = [leader.result()] + [follower.result() for follower in followers]
+    assert results == ['accounts'] * 8
+    assert len(calls) == 1
+
+
+def test_invalidate_during_fetch_wins(clock):
+    cache = ResponseCache(clock=clock)
+
+    def fetch():
+        cache.invalidate(access_token='token')
+        return 'stale'
+
+    assert cache.get_or_fetch('accounts', 'token', fetch, ttl=60) == 'stale'
+    assert cache.peek('accounts', 'token') == (None, None)
@@ -0,0 +1,124 @@
+import pytest
+
+from mock_plaid_server import MockPlaidServer
+
+TOKEN = 'access-sandbox-test'
+
+
+@pytest.fixture(scope='module')
+def mock_plaid():
+    # plaid builds a model per synced row, so keep the data set small
+    with MockPlaidServer(transactions=150, days=60) as server:
+        yield server
+
+
+def fail(monkeypatch, mock_plaid, should_fail, status, error_type, error_code):
+    """
+    makes the mock answer /transactions/sync with a plaid error whenever
+    should_fail(body, attempt) says so.  returns the bodies it was sent
+    """
+    handle = mock_plaid.handle
+    bodies = []
+
+    def failing(path, body):
+        if path != '/transactions/sync':
+            return handle(path, body)
+        bodies.append(body)
+        if should_fail(body, len(bodies)):
+            mock_plaid.requests += 1
+            return status, mock_plaid.error(error_type, error_code)
+        return handle(path, body)
+    monkeypatch.setattr(mock_plaid, 'handle', failing)
+    return bodies
+
+
+def record(monkeypatch, mock_plaid):
+    return fail(monkeypatch, mock_plaid, lambda body, attempt: False, None, None, None)
+
+
+def stored_ids(interface):
+    return sorted(row['transaction_id'] for row in interface.store.get_transactions(TOKEN))
+
+
+def all_ids(mock_plaid):
+    return sorted(row['transaction_id'] for row in mock_plaid.transactions)
+
+
+@pytest.fixture
+def paged(interface):
+    interface.PLAID_PAGE_SIZE = 50
+    return interface
+
+
+def test_first_sync_pulls_everything_and_saves_the_cursor(paged, mock_plaid, monkeypatch):
+    bodies = record(monkeypatch, mock_plaid)
+    result = paged.sync_transactions()
+    assert result == {'added': 150, 'modified': 0, 'removed': 0, 'next_cursor': '150'}
+    assert stored_ids(paged) == all_ids(mock_plaid)
+    assert paged.store.get_cursor(TOKEN) == '150'
+    assert [body.get('cursor') for body in bodies] == [None, '50', '100']
+    assert {body['count'] for body in bodies} == {50}
+
+
+def test_next_sync_starts_from_the_saved_cursor(paged, mock_plaid, monkeypatch):
+    paged.sync_transactions()
+    bodies = record(monkeypatch, mock_plaid)
+    assert paged.sync_transactions() == {'added': 0, 'modified': 0, 'removed': 0, 'next_cursor': '150'}
+    assert [body['cursor'] for body in bodies] == ['150']
+    assert stored_ids(paged) == all_ids(mock_plaid)
+
+
+def test_modified_and_removed_are_applied(paged, mock_plaid, monkeypatch):
+    paged.sync_transactions()
+    changed = dict(mock_plaid.transactions[0], amount=123.45)
+    gone = mock_plaid.transactions[1]
+    monkeypatch.setattr(mock_plaid, 'transactions_sync', lambda body: {
+        'transactions_update_status': 'HISTORICAL_UPDATE_COMPLETE',
+        'accounts': mock_plaid.accounts,
+        'added': [],
+        'modified': [changed],
+        'removed': [{'transaction_id': gone['transaction_id'], 'account_id': gone['account_id']}],
+        'next_cursor': 'after-update',
+        'has_more': False,
+    })
+    assert paged.sync_transactions() == {'added': 0, 'modified': 1, 'removed': 1, 'next_cursor': 'after-update'}
+    stored = {row['transaction_id']: row for row in paged.store.get_transactions(TOKEN)}
+    assert gone['transaction_id'] not in stored
+    assert stored[changed['transaction_id']]['amount'] == 123.45
+    assert len(stored) == 149
+    assert paged.store.get_cursor(TOKEN) == 'after-update'
+
+
+def test_mutation_during_pagination_restarts_from_the_saved_cursor(paged, mock_plaid, monkeypatch):
+    # the third page fails once: the pages already read are thrown away
+    bodies = fail(monkeypatch, mock_plaid, lambda body, attempt: attempt == 3, 400,
+                  'TRANSACTIONS_ERROR', 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION')
+    result = paged.sync_transactions()
+    assert result['added'] == 150 and result['next_cursor'] == '150'
+    assert [body.get('cursor') for body in bodies] == [None, '50', '100', None, '50', '100']
+    assert stored_ids(paged) == all_ids(mock_plaid)
+
+
+def test_retryable_errors_are_retried_in_place(paged, mock_plaid, monkeypatch):
+    bodies = fail(monkeypatch, mock_plaid, lambda body, attempt: attempt in (2, 3), 429,
+                  'RATE_LIMIT_EXCEEDED', 'TRANSACTIONS_SYNC_LIMIT')
+    assert paged.sync_transactions()['added'] == 150
+    assert [body.get('cursor') for body in bodies] == [None, '50', '50', '50', '100']
+
+
+def test_other_errors_leave_store_and_cursor_alone(paged, mock_plaid, monkeypatch):
+    paged.sync_transactions()
+    fail(monkeypatch, mock_plaid, lambda body, attempt: True, 400, 'ITEM_ERROR', 'ITEM_LOGIN_REQUIRED')
+    result = paged.sync_transactions()
+    assert result['error']['error_code'] == 'ITEM_LOGIN_REQUIRED'
+    assert paged.store.get_cursor(TOKEN) == '150'
+    assert stored_ids(paged) == all_ids(mock_plaid)
+
+
+def test_open_circuit_is_reported(paged, mock_plaid, monkeypatch):
+    paged.circuit_breakers = type(paged.circuit_breakers)(failure_threshold=1)
+    fail(monkeypatch, mock_plaid, lambda body, attempt: attempt == 1, 500, 'API_ERROR', 'INTERNAL_SERVER_ERROR')
+    paged.retry_policy.max_retries = 0
+    assert paged.sync_transactions()['error']['error_code'] == 'INTERNAL_SERVER_ERROR'
+    assert paged.sync_transactions()['error']['error_code'] == 'CIRCUIT_OPEN'
+    assert paged.store.get_cursor(TOKEN) is None
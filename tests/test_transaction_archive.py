@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+from transaction_archive import TransactionArchive
+
+
+def transactions(rows):
+    return pd.DataFrame(rows, columns=['transaction_id', 'account_id', 'date', 'amount', 'pending',
+                                       'pending_transaction_id'])
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = TransactionArchive(str(tmp_path / 'archive'))
+    archive.append(transactions([
+        ['t1', 'acc-1', '2024-01-30', 10.0, True, None],
+        ['t2', 'acc-1', '2024-01-31', 20.0, True, None],
+        ['t3', 'acc-2', '2024-01-15', 5.0, False, None],
+        ['t4', 'acc-1', '2024-01-20', 7.5, True, None],
+    ]))
+    # t1 and t2 post, t2 into the next month; t4 is still pending
+    archive.append(transactions([
+        ['p1', 'acc-1', '2024-01-31', 10.0, False, 't1'],
+        ['p2', 'acc-1', '2024-02-02', 20.0, False, 't2'],
+    ]))
+    return archive
+
+
+def test_posted_transactions_replace_their_pending_copies(archive):
+    frame = archive.load()
+    assert sorted(frame['transaction_id']) == ['p1', 'p2', 't3', 't4']
+    assert frame['amount'].sum() == 42.5
+
+
+def test_pending_copy_stays_out_when_its_posted_copy_is_outside_the_range(archive):
+    assert sorted(archive.load(end='2024-01-31')['transaction_id']) == ['p1', 't3', 't4']
+    assert sorted(archive.load(start='2024-01-25', end='2024-01-31', account_ids=['acc-1'])['transaction_id']) == ['p1']
+
+
+def test_latest_copy_wins(archive):
+    archive.append(transactions([['t3', 'acc-2', '2024-01-15', 6.0, False, None]]))
+    frame = archive.load(account_ids=['acc-2'], columns=['amount'])
+    assert frame['amount'].tolist() == [6.0]
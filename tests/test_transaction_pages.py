@@ -0,0 +1,105 @@
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+
+class Pages():
+    """
+    stands in for _request_transactions_page: serves rows out of a list
+    and reports a total that a test may change between pages
+    """
+
+    def __init__(self, rows, total=None):
+        self.rows = rows
+        self.total = len(rows) if total is None else total
+        self.offsets = []
+        self.requested = {}
+
+    def __call__(self, start, end, offset, count):
+        self.offsets.append(offset)
+        self.requested.setdefault(offset, threading.Event()).set()
+        return {'transactions': self.rows[offset:offset + count], 'total_transactions': self.total}
+
+    def wait_for(self, offset):
+        return self.requested.setdefault(offset, threading.Event()).wait(5)
+
+
+def pages_of(interface, pages, page_size):
+    interface._request_transactions_page = pages
+    return interface._iter_transaction_pages(date(2024, 1, 1), date(2024, 1, 31), page_size=page_size)
+
+
+@pytest.mark.parametrize('count, page_size, offsets', [
+    (1234, 500, [0, 500, 1000]),
+    (1000, 500, [0, 500]),
+    (499, 500, [0]),
+    (0, 500, [0]),
+    (10, 3, [0, 3, 6, 9]),
+])
+def test_pages_until_total_transactions(interface, count, page_size, offsets):
+    pages = Pages(['t%d' % i for i in range(count)])
+    rows = [row for page in pages_of(interface, pages, page_size) for row in page['transactions']]
+    assert rows == pages.rows
+    assert pages.offsets == offsets
+
+
+def test_page_size_is_capped_at_plaids_maximum(interface):
+    pages = Pages(['t%d' % i for i in range(1200)])
+    list(pages_of(interface, pages, 10000))
+    assert pages.offsets == [0, 500, 1000]
+
+
+def test_empty_page_stops_a_total_that_overstates(interface):
+    # plaid said 900 but only 600 are there by the time we page
+    pages = Pages(['t%d' % i for i in range(600)], total=900)
+    assert [len(page['transactions']) for page in pages_of(interface, pages, 250)] == [250, 250, 100, 0]
+    assert pages.offsets == [0, 250, 500, 600]
+
+
+def test_total_is_read_from_every_page(interface):
+    class Shrinking(Pages):
+        # transactions were removed while paging: later pages say 450
+        def __call__(self, start, end, offset, count):
+            self.total = 1000 if offset == 0 else 450
+            return Pages.__call__(self, start, end, offset, count)
+
+    pages = Shrinking(['t%d' % i for i in range(1000)])
+    assert [len(page['transactions']) for page in pages_of(interface, pages, 300)] == [300, 300]
+    assert pages.offsets == [0, 300]
+
+
+def test_next_page_is_prefetched_before_the_caller_asks(interface):
+    pages = Pages(['t%d' % i for i in range(1000)])
+    iterator = pages_of(interface, pages, 400)
+    next(iterator)
+    # still holding the first page, the second is already on its way
+    assert pages.wait_for(400)
+    next(iterator)
+    assert pages.wait_for(800)
+    next(iterator)
+    assert list(iterator) == []
+    assert pages.offsets == [0, 400, 800]
+
+
+def test_get_transactions_from_plaid_against_the_mock(interface, mock_plaid):
+    start, end = date.today() - timedelta(days=20), date.today() - timedelta(days=5)
+    requests = mock_plaid.requests
+    response = interface.get_transactions_from_plaid(start, end, page_size=40)
+    expected = [row['transaction_id'] for row in mock_plaid.transactions if str(start) <= row['date'] <= str(end)]
+    assert [row['transaction_id'] for row in response['transactions']] == expected
+    assert response['total_transactions'] == len(expected)
+    assert mock_plaid.requests - requests == -(-len(expected) // 40)
+
+
+def test_iter_transactions_batches_cover_every_window(interface, mock_plaid):
+    # two windows, newest first
+    start = date.today() - timedelta(days=40)
+    batches = list(interface.iter_transactions(start, batch_size=64, page_size=50))
+    ids = [transaction_id for batch in batches for transaction_id in batch['transaction_id']]
+    expected = [row['transaction_id'] for row in mock_plaid.transactions if row['date'] >= str(start)]
+    assert all(len(batch) == 64 for batch in batches[:-1]) and 0 < len(batches[-1]) <= 64
+    assert sorted(ids) == sorted(expected)
+    assert len(set(ids)) == len(ids)
+    dates = [day for batch in batches for day in batch['date']]
+    assert dates == sorted(dates, reverse=True)
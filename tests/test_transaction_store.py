@@ -0,0 +1,111 @@
+from collections import defaultdict
+
+import pytest
+
+from transaction_store import SCHEMA_VERSION, TransactionStore
+
+
+TOKEN = 'access-sandbox-test'
+
+
+def transaction(transaction_id, amount, date='2024-01-15', account_id='acc-1', category='Food',
+                currency='USD'):
+    return {
+        'transaction_id': transaction_id,
+        'account_id': account_id,
+        'date': date,
+        'amount': amount,
+        'category': [category] if category is not None else None,
+        'iso_currency_code': currency,
+        'unofficial_currency_code': None,
+    }
+
+
+def recompute(store):
+    """
+    the summaries worked out in python from the stored transactions
+    """
+    groups = defaultdict(lambda: [0, 0, 0])
+    for row in store.get_transactions(TOKEN):
+        key = (row['account_id'], (row['category'] or [''])[0], row['date'][:7], row['iso_currency_code'] or '')
+        cents = int(round(row['amount'] * 100))
+        groups[key][0] += max(cents, 0)
+        groups[key][1] += min(cents, 0)
+        groups[key][2] += 1
+    return {key: tuple(value) for key, value in groups.items()}
+
+
+def summaries(store):
+    return {(row['account_id'], row['category'], row['month'], row['currency']):
+            (row['outflow_cents'], row['inflow_cents'], row['transaction_count'])
+            for row in store.get_monthly_summaries(TOKEN)}
+
+
+@pytest.fixture
+def store():
+    store = TransactionStore(':memory:')
+    yield store
+    store.close()
+
+
+def test_insert_builds_summaries(store):
+    store.replace_window(TOKEN, '2024-01-01', '2024-02-29', [
+        transaction('t1', 12.5),
+        transaction('t2', -100.0),
+        transaction('t3', 3.25, date='2024-02-01'),
+        transaction('t4', 7.0, category=None, currency=None),
+    ])
+    assert summaries(store) == recompute(store)
+    assert summaries(store)[('acc-1', 'Food', '2024-01', 'USD')] == (1250, -10000, 2)
+    assert summaries(store)[('acc-1', '', '2024-01', '')] == (700, 0, 1)
+
+
+def test_conflict_update_moves_amount_between_groups(store):
+    store.apply_sync(TOKEN, [transaction('t1', 10.0), transaction('t2', 5.0)], [], [], 'cursor-1')
+    # same id, new amount, month and category: the upsert's update path
+    store.apply_sync(TOKEN, [], [transaction('t1', 42.0, date='2024-03-02', category='Travel')], [], 'cursor-2')
+    assert summaries(store) == recompute(store)
+    assert summaries(store)[('acc-1', 'Food', '2024-01', 'USD')] == (500, 0, 1)
+    assert summaries(store)[('acc-1', 'Travel', '2024-03', 'USD')] == (4200, 0, 1)
+
+
+def test_delete_drops_empty_groups(store):
+    store.apply_sync(TOKEN, [transaction('t1', 10.0), transaction('t2', 5.0, account_id='acc-2')], [], [], 'c1')
+    store.apply_sync(TOKEN, [], [], ['t2'], 'c2')
+    assert summaries(store) == recompute(store)
+    assert ('acc-2', 'Food', '2024-01', 'USD') not in summaries(store)
+
+
+def test_replace_window_matches_recompute(store):
+    store.replace_window(TOKEN, '2024-01-01', '2024-01-31', [transaction('t%d' % i, i - 3.5) for i in range(8)])
+    store.replace_window(TOKEN, '2024-01-01', '2024-01-31', [transaction('t%d' % i, 2.0 * i) for i in range(4, 10)])
+    assert summaries(store) == recompute(store)
+    assert summaries(store) == {('acc-1', 'Food', '2024-01', 'USD'): (7800, 0, 6)}
+
+
+def test_rebuild_matches_triggers(store):
+    store.replace_window(TOKEN, '2024-01-01', '2024-03-31', [
+        transaction('t%d' % i, (-1) ** i * i * 1.01, date='2024-0%d-10' % (i % 3 + 1), account_id='acc-%d' % (i % 2),
+                    category=['Food', 'Travel', None][i % 3])
+        for i in range(30)
+    ])
+    store.apply_sync(TOKEN, [], [transaction('t3', 99.99)], ['t4', 't5'], 'c1')
+    maintained = summaries(store)
+    store.rebuild_monthly_summaries()
+    assert summaries(store) == maintained == recompute(store)
+
+
+def test_migration_backfills_old_files(tmp_path):
+    path = str(tmp_path / 'store.sqlite')
+    store = TransactionStore(path)
+    store.replace_window(TOKEN, '2024-01-01', '2024-01-31', [transaction('t1', 10.0), transaction('t2', 2.5)])
+    # what a file written before monthly_summaries existed looks like
+    store.connection.execute('DELETE FROM monthly_summaries')
+    store.connection.execute('PRAGMA user_version = 0')
+    store.connection.commit()
+    store.close()
+
+    store = TransactionStore(path)
+    assert summaries(store) == recompute(store) == {('acc-1', 'Food', '2024-01', 'USD'): (1250, 0, 2)}
+    assert store.connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    store.close()